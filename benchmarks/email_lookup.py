@@ -0,0 +1,87 @@
+import argparse
+import random
+import sqlite3
+import string
+import tempfile
+import time
+from contextlib import closing
+from pathlib import Path
+
+from databases.database_connection import iterate_chunks
+
+
+def random_email(rng):
+    first_name = ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 8)))
+    last_name = ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 10)))
+    return f'{first_name.capitalize()}.{last_name.capitalize()}@thermofisher.com'
+
+
+def create_employee_database(path, rows, rng):
+    emails = list({random_email(rng) for _ in range(rows)})
+    with closing(sqlite3.connect(path)) as connection, connection:
+        connection.execute('CREATE TABLE "V_EMPLOYEE_ITAsset" (employee_id VARCHAR(20) PRIMARY KEY, '
+                           'worker_name NVARCHAR(200), email_primary_work NVARCHAR(100) COLLATE NOCASE, '
+                           'band NVARCHAR(200))')
+        connection.executemany('INSERT INTO "V_EMPLOYEE_ITAsset" VALUES (?, ?, ?, ?)',
+                               ((str(index), email.split('@')[0], email, str(rng.randint(1, 14))) for index, email in
+                                enumerate(emails)))
+        connection.execute('CREATE INDEX ix_employee_email ON "V_EMPLOYEE_ITAsset" (email_primary_work)')
+    return emails
+
+
+def get_column(lookup):
+    return 'lower(email_primary_work)' if lookup == 'lower' else 'email_primary_work'
+
+
+def explain(path, lookup):
+    with closing(sqlite3.connect(path)) as connection:
+        plan = connection.execute(f'EXPLAIN QUERY PLAN SELECT band FROM "V_EMPLOYEE_ITAsset" '
+                                  f'WHERE {get_column(lookup)} = ?', ('a@thermofisher.com',)).fetchall()
+    return '; '.join(row[-1] for row in plan)
+
+
+def run_lookup(path, lookup, emails, single_lookups):
+    column = get_column(lookup)
+    emails = [email.strip().lower() for email in emails]
+    with closing(sqlite3.connect(path)) as connection:
+        start = time.perf_counter()
+        for email in emails[:single_lookups]:
+            connection.execute(f'SELECT band FROM "V_EMPLOYEE_ITAsset" WHERE {column} = ?', (email,)).fetchone()
+        single_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        bands = {}
+        for chunk in iterate_chunks(set(emails)):
+            rows = connection.execute(f'SELECT email_primary_work, band FROM "V_EMPLOYEE_ITAsset" WHERE {column} IN '
+                                      f'({", ".join("?" * len(chunk))})', chunk).fetchall()
+            bands.update((email.lower(), band) for email, band in rows)
+        bulk_seconds = time.perf_counter() - start
+    return single_seconds, bulk_seconds, bands
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare employee email lookup predicates against a SQLite stand-in '
+                                                 'whose NOCASE column mirrors the MSSQL collation normalized needs')
+    parser.add_argument('--rows', type=int, default=300000)
+    parser.add_argument('--lookups', type=int, default=5000)
+    parser.add_argument('--single-lookups', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as folder:
+        path = Path(folder, 'employee.sqlite')
+        emails = create_employee_database(path, args.rows, rng)
+        lookup_emails = [email.upper() if index % 2 else email for index, email in
+                         enumerate(rng.sample(emails, min(args.lookups, len(emails))))]
+        print(f'{len(emails)} employees, {len(lookup_emails)} bulk lookups, {args.single_lookups} single lookups')
+        results = {}
+        for lookup in ('lower', 'normalized'):
+            single_seconds, bulk_seconds, results[lookup] = run_lookup(path, lookup, lookup_emails,
+                                                                       args.single_lookups)
+            print(f'{lookup:>10}: single {single_seconds:8.3f}s, bulk {bulk_seconds:8.3f}s, '
+                  f'plan: {explain(path, lookup)}')
+        print(f"results identical: {results['lower'] == results['normalized']}")
+
+
+if __name__ == '__main__':
+    main()
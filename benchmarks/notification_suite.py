@@ -0,0 +1,328 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial, wraps
+from pathlib import Path
+
+import pandas as pd
+from dotenv import load_dotenv
+
+import parse_asset_report
+import parse_return_report
+import send_asset_notification
+import send_mfa_request_notification
+import send_quarterly_asset_notification
+import send_return_notification
+from benchmarks.stand_ins import create_directory_database, it_contact_stand_in, smtp_sink
+from benchmarks.synthetic_reports import generate_employees, write_reports
+from databases.database_connection import dispose_engines
+from emails.dispatcher import NotificationDispatcher
+from emails.smtp_pool import SMTPConnectionPool
+from emails.templates import EmailTemplate
+from utils.campaign_state import CampaignState
+from utils.email_logger import EmailSendingLogger
+from utils.pipeline import Pipeline
+
+BENCHMARK_SENDERS = {
+    'ASSET_EMAIL_SENDER': 'it.asset@thermofisher.com',
+    'ASSET_EMAIL_SENDER_ADDRESS': 'Shanghai;China',
+    'RETURN_EMAIL_SENDER': 'it.return@thermofisher.com',
+    'RETURN_EMAIL_CC': 'it.return.cc@thermofisher.com',
+    'RETURN_ERROR_EMAIL_SENDER': 'it.return@thermofisher.com',
+    'RETURN_SUMMARY_EMAIL_SENDER': 'it.return@thermofisher.com',
+    'QUARTERLY_ASSET_EMAIL_SENDER': 'it.inventory@thermofisher.com',
+    'QUARTERLY_ASSET_EMAIL_CC': 'it.inventory.cc@thermofisher.com',
+    'INVENTORY_ERROR_EMAIL_SENDER': 'it.inventory@thermofisher.com',
+    'INVENTORY_SUMMARY_EMAIL_SENDER': 'it.inventory@thermofisher.com',
+    'MFA_REQUEST_EMAIL_SENDER': 'it.security@thermofisher.com',
+    'MFA_ERROR_EMAIL_SENDER': 'it.security@thermofisher.com',
+    'MFA_SUMMARY_EMAIL_SENDER': 'it.security@thermofisher.com'
+}
+
+
+class PhaseTimer(object):
+    def __init__(self):
+        self.phases = {}
+        self.lock = threading.Lock()
+
+    def record(self, phase, seconds):
+        with self.lock:
+            total, calls = self.phases.get(phase, (0.0, 0))
+            self.phases[phase] = (total + seconds, calls + 1)
+
+    def wrap(self, func, phase):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(phase, time.perf_counter() - start)
+
+        return wrapper
+
+    @contextmanager
+    def patch(self, phases):
+        originals = []
+        try:
+            for owner, attribute, phase in phases:
+                originals.append((owner, attribute, getattr(owner, attribute)))
+                setattr(owner, attribute, self.wrap(originals[-1][2], phase))
+            yield self
+        finally:
+            for owner, attribute, original in reversed(originals):
+                setattr(owner, attribute, original)
+
+    def summary(self):
+        return {phase: {'seconds': round(seconds, 4), 'calls': calls} for phase, (seconds, calls) in
+                self.phases.items()}
+
+
+class BenchmarkTarget(object):
+    def __init__(self, name, report_folder, run, phases):
+        self.name = name
+        self.report_folder = report_folder
+        self.run = run
+        self.phases = phases
+
+
+def build_targets(use_cache):
+    dispatch_phases = [
+        (NotificationDispatcher, 'dispatch', 'dispatch'),
+        (EmailTemplate, 'render', 'render'),
+        (SMTPConnectionPool, 'sendmail', 'smtp')
+    ]
+    return [
+        BenchmarkTarget('parse_asset_report', 'asset', partial(parse_asset_report.parse_report, use_cache=use_cache), [
+            (parse_asset_report, 'read_excel_report', 'read'),
+            (parse_asset_report, 'iter_excel_report_chunks', 'read'),
+            (parse_asset_report, 'to_categorical', 'categorize'),
+            (Pipeline, 'run', 'pipeline'),
+            (parse_asset_report, 'build_summary', 'summarize'),
+            (parse_asset_report, 'write_handoff', 'handoff'),
+            (parse_asset_report, 'export_dataframe_to_excel', 'excel'),
+            (parse_asset_report, 'export_dataframes_to_excel', 'excel')
+        ]),
+        BenchmarkTarget('send_asset_notification', 'asset', partial(send_asset_notification.send_notification,
+                                                                    delta=False), [
+            (send_asset_notification, 'read_handoff', 'read'),
+            (send_asset_notification, 'fill_missing', 'clean'),
+            (send_asset_notification, 'fingerprint', 'fingerprint'),
+            *dispatch_phases,
+            (CampaignState, 'save', 'state')
+        ]),
+        BenchmarkTarget('parse_return_report', 'return', partial(parse_return_report.parse_report, use_cache=use_cache),
+                        [
+                            (parse_return_report, 'read_excel_report', 'read'),
+                            (Pipeline, 'run', 'pipeline'),
+                            (parse_return_report, 'write_handoff', 'handoff'),
+                            (parse_return_report, 'export_dataframe_to_excel', 'excel')
+                        ]),
+        BenchmarkTarget('send_return_notification', 'return', send_return_notification.send_notification, [
+            (send_return_notification, 'read_handoff', 'read'),
+            (send_return_notification, 'validate_info', 'validate'),
+            *dispatch_phases,
+            (send_return_notification, 'generate_summary_data', 'summary'),
+            (send_return_notification, 'attach_excel', 'attachment')
+        ]),
+        BenchmarkTarget('send_quarterly_asset_notification', 'quarterly',
+                        partial(send_quarterly_asset_notification.send_notification, use_cache=use_cache,
+                                delta=False), [
+                            (send_quarterly_asset_notification, 'load_report', 'read'),
+                            (send_quarterly_asset_notification, 'validate_info', 'validate'),
+                            (send_quarterly_asset_notification, 'get_high_band_emails', 'directory'),
+                            *dispatch_phases,
+                            (CampaignState, 'save', 'state'),
+                            (send_quarterly_asset_notification, 'generate_summary_data', 'summary'),
+                            (send_quarterly_asset_notification, 'attach_excel', 'attachment')
+                        ]),
+        BenchmarkTarget('send_mfa_request_notification', 'mfa',
+                        partial(send_mfa_request_notification.send_notification, use_cache=use_cache), [
+                            (send_mfa_request_notification, 'load_report', 'read'),
+                            (send_mfa_request_notification, 'validate_info', 'validate'),
+                            (send_mfa_request_notification, 'get_high_band_emails', 'directory'),
+                            *dispatch_phases,
+                            (send_mfa_request_notification, 'generate_summary_data', 'summary'),
+                            (send_mfa_request_notification, 'attach_excel', 'attachment')
+                        ])
+    ]
+
+
+def to_env_path(path):
+    return ','.join(Path(path).resolve().parts[1:])
+
+
+def configure_environment(work_folder, sink, use_cache):
+    load_dotenv()
+    os.environ.update({
+        'LOG_FOLDER': to_env_path(Path(work_folder, 'log')),
+        'REPORT_CACHE_ENABLED': str(use_cache).lower(),
+        'REPORT_CACHE_FOLDER': to_env_path(Path(work_folder, 'cache')),
+        'CAMPAIGN_STATE_FOLDER': to_env_path(Path(work_folder, 'campaign')),
+        'EMAIL_JOURNAL_FOLDER': to_env_path(Path(work_folder, 'journal')),
+        'CAMPAIGN_DELTA_MODE': 'false',
+        'EMP_SNAPSHOT_ENABLED': 'false',
+        'SMTP_SERVER': sink.host,
+        'SMTP_PORT': str(sink.port),
+        'ASSET_REPORT_NAME': 'asset report.xlsx',
+        'QUARTERLY_ASSET_REPORT_FOLDER': 'quarterly'
+    })
+    for name, value in BENCHMARK_SENDERS.items():
+        if not os.getenv(name):
+            os.environ[name] = value
+
+
+def prepare_reports(folder, rows, seed, target_month):
+    marker = Path(folder, 'reports.json')
+    settings = {'rows': rows, 'seed': seed, 'month': target_month}
+    if marker.exists():
+        reports = json.loads(marker.read_text(encoding='UTF-8'))
+        if reports['settings'] == settings:
+            return reports['employees']
+    employees = write_reports(folder, rows, seed, target_month)
+    marker.write_text(json.dumps({'settings': settings, 'employees': employees}), encoding='UTF-8')
+    return employees
+
+
+def prepare_directory(folder, employees, seed):
+    path = Path(folder, 'directory.sqlite')
+    if path.exists():
+        path.unlink()
+    others = [employee['email'] for employee in generate_employees(max(10, len(employees['mfa']) // 10),
+                                                                  random.Random(seed + 1))]
+    return create_directory_database(path, employees['quarterly'] + employees['mfa'],
+                                     vip_emails=others[::2], high_band_emails=others[1::2])
+
+
+def run_target(target, sink, repeat):
+    runs = []
+    for _ in range(repeat):
+        EmailSendingLogger().start_run()
+        sink.reset()
+        timer = PhaseTimer()
+        with timer.patch(target.phases):
+            start = time.perf_counter()
+            target.run()
+            seconds = time.perf_counter() - start
+        SMTPConnectionPool().close_all()
+        results = EmailSendingLogger().count_results()
+        runs.append({
+            'seconds': round(seconds, 4),
+            'phases': timer.summary(),
+            'smtp': sink.stats(),
+            'log': {'sent': results['success'], 'failed': results['failed'],
+                    'failures_by_code': EmailSendingLogger().count_failures_by_code()}
+        })
+    return runs
+
+
+def get_commit():
+    repository = Path(__file__).resolve().parents[1]
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                                cwd=repository).stdout
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True,
+                                text=True, check=True, cwd=repository).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit.strip(), bool(status.strip())
+
+
+def run_suite(sizes, targets, repeat, seed, use_cache, reject_rate, data_folder=None):
+    commit, dirty = get_commit()
+    target_month = datetime.datetime.now().month
+    results = []
+    with tempfile.TemporaryDirectory() as work_folder, smtp_sink(reject_rate) as sink, it_contact_stand_in():
+        configure_environment(work_folder, sink, use_cache)
+        for rows in sizes:
+            size_folder = Path(work_folder, str(rows))
+            report_folder = Path(data_folder or work_folder, 'reports', str(rows))
+            employees = prepare_reports(report_folder, rows, seed, target_month)
+            database_url = prepare_directory(work_folder, employees, seed)
+            os.environ.update({
+                'OUTPUT_FOLDER': to_env_path(Path(size_folder, 'output')),
+                'EMP_INFO_URL': database_url,
+                'EMP_COLLECT_URL': database_url,
+                'RETURN_REPORT_MONTH': str(target_month)
+            })
+            for target in build_targets(use_cache):
+                if targets and target.name not in targets:
+                    continue
+                os.environ['REPORT_FOLDER'] = to_env_path(Path(report_folder, target.report_folder))
+                runs = run_target(target, sink, repeat)
+                median = statistics.median(run['seconds'] for run in runs)
+                print(f'{target.name:>34} {rows:>8} rows: {median:9.3f}s, '
+                      f"{runs[-1]['log']['sent']} sent, {runs[-1]['log']['failed']} failed")
+                results.append({'target': target.name, 'rows': rows, 'median_seconds': round(median, 4),
+                                'runs': runs})
+            dispose_engines()
+    return {
+        'commit': commit,
+        'dirty': dirty,
+        'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'settings': {'sizes': sizes, 'repeat': repeat, 'seed': seed, 'cache': use_cache, 'reject_rate': reject_rate},
+        'results': results
+    }
+
+
+def median_phases(runs):
+    phases = {phase for run in runs for phase in run['phases']}
+    return {phase: statistics.median(run['phases'].get(phase, {'seconds': 0.0})['seconds'] for run in runs) for phase
+            in phases}
+
+
+def compare_results(base_path, head_path):
+    base, head = [json.loads(Path(path).read_text(encoding='UTF-8')) for path in (base_path, head_path)]
+    print(f"base {base['commit']} ({base['created_at']}), head {head['commit']} ({head['created_at']})")
+    base_results = {(result['target'], result['rows']): result for result in base['results']}
+    for result in head['results']:
+        base_result = base_results.get((result['target'], result['rows']))
+        if base_result is None:
+            continue
+        ratio = result['median_seconds'] / base_result['median_seconds'] if base_result['median_seconds'] else 0
+        print(f"{result['target']:>34} {result['rows']:>8} rows: {base_result['median_seconds']:9.3f}s -> "
+              f"{result['median_seconds']:9.3f}s ({ratio:5.2f}x)")
+        base_phases, head_phases = median_phases(base_result['runs']), median_phases(result['runs'])
+        for phase in sorted(set(base_phases) | set(head_phases)):
+            print(f"{phase:>44}: {base_phases.get(phase, 0.0):9.3f}s -> {head_phases.get(phase, 0.0):9.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time report parsing and notification sending end to end against '
+                                                 'synthetic reports, a local SMTP sink and a SQLite directory')
+    parser.add_argument('--sizes', default='1000,10000,100000', help='comma separated report row counts')
+    parser.add_argument('--targets', default='', help='comma separated target names, all targets by default')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--cache', action='store_true', help='keep the parsed report cache enabled between runs')
+    parser.add_argument('--reject-rate', type=float, default=0.01, help='share of recipients the SMTP sink refuses')
+    parser.add_argument('--data-folder', default=None, help='reuse generated reports from this folder')
+    parser.add_argument('--output', default=None, help='result file, named after the current commit by default')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'HEAD'), help='compare two result files and exit')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare_results(*args.compare)
+        return
+    sizes = [int(size) for size in args.sizes.split(',')]
+    targets = [target for target in args.targets.split(',') if target]
+    suite = run_suite(sizes, targets, args.repeat, args.seed, args.cache, args.reject_rate, args.data_folder)
+    output = Path(args.output or f"notification_suite_{(suite['commit'] or 'unknown')[:12]}.json")
+    output.write_text(json.dumps(suite, ensure_ascii=False, indent=2), encoding='UTF-8')
+    print(f'results written to {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+import socketserver
+import threading
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+
+from sqlalchemy import create_engine
+
+import emails.emails
+from databases.models import Base, ChinaVIP, Employee
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode('ascii'))
+
+    def receive_data(self):
+        size = 0
+        for line in self.rfile:
+            if line == b'.\r\n':
+                break
+            size += len(line)
+        return size
+
+    def handle(self):
+        sink = self.server.sink
+        recipients = []
+        self.reply('220 benchmark SMTP sink ready')
+        for line in self.rfile:
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command[:4].upper()
+            if verb == 'EHLO':
+                self.reply('250-benchmark')
+                self.reply('250 8BITMIME')
+            elif verb in ('HELO', 'NOOP'):
+                self.reply('250 OK')
+            elif verb in ('MAIL', 'RSET'):
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                address = command[command.find('<') + 1:command.rfind('>')]
+                if sink.is_rejected(address):
+                    sink.record_rejection()
+                    self.reply('550 5.1.1 Mailbox unavailable')
+                else:
+                    recipients.append(address)
+                    self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                sink.record_message(recipients, self.receive_data())
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class SMTPSink(object):
+    def __init__(self, host='127.0.0.1', port=0, reject_rate=0.0):
+        self.reject_rate = reject_rate
+        self.lock = threading.Lock()
+        self.server = socketserver.ThreadingTCPServer((host, port), SMTPSinkHandler)
+        self.server.daemon_threads = True
+        self.server.sink = self
+        self.host, self.port = self.server.server_address
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.reset()
+
+    def is_rejected(self, address):
+        return zlib.crc32(address.lower().encode('utf-8')) % 10000 < self.reject_rate * 10000
+
+    def record_rejection(self):
+        with self.lock:
+            self.rejected += 1
+
+    def record_message(self, recipients, size):
+        with self.lock:
+            self.messages += 1
+            self.recipients += len(recipients)
+            self.bytes += size
+
+    def reset(self):
+        with self.lock:
+            self.messages = 0
+            self.recipients = 0
+            self.rejected = 0
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {'messages': self.messages, 'recipients': self.recipients, 'rejected': self.rejected,
+                    'bytes': self.bytes}
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@contextmanager
+def smtp_sink(reject_rate=0.0):
+    sink = SMTPSink(reject_rate=reject_rate)
+    sink.start()
+    try:
+        yield sink
+    finally:
+        sink.stop()
+
+
+def create_directory_database(path, employee_emails, vip_emails=(), high_band_emails=(), band=5):
+    engine = create_engine(f'sqlite:///{path}')
+    try:
+        Base.metadata.create_all(engine)
+        employees = {email.lower(): (email, band) for email in employee_emails}
+        employees.update({email.lower(): (email, 12) for email in high_band_emails})
+        with engine.begin() as connection:
+            connection.execute(Employee.__table__.insert(), [{
+                'employee_id': str(index),
+                'worker_name': email.split('@')[0],
+                'email_primary_work': email,
+                'band': str(employee_band)
+            } for index, (email, employee_band) in enumerate(employees.values())])
+            if vip_emails:
+                connection.execute(ChinaVIP.__table__.insert(), [{'email': email} for email in vip_emails])
+    finally:
+        engine.dispose()
+    return f'sqlite:///{path}'
+
+
+@contextmanager
+def it_contact_stand_in():
+    if Path(emails.emails.__file__).with_name('it_contact.csv').exists():
+        yield
+        return
+    original = emails.emails.generate_it_contact
+    emails.emails.generate_it_contact = lambda: '<table border="1"><tr><th>驻场工程师</th></tr></table>'
+    try:
+        yield
+    finally:
+        emails.emails.generate_it_contact = original
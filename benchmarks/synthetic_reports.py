@@ -0,0 +1,204 @@
+import argparse
+import datetime
+import random
+import string
+from pathlib import Path
+
+import pandas as pd
+
+from benchmarks.email_lookup import random_email
+from utils.excel_writer import export_dataframe_to_excel, open_excel_writer
+
+SURNAMES = '王李张刘陈杨黄赵吴周徐孙马朱胡郭何林罗高'
+GIVEN_NAMES = '伟芳娜敏静丽强磊军洋勇艳杰涛明超秀霞平刚桂英华'
+DEPARTMENTS = ['IT', 'Finance', 'HR', 'Sales', 'Marketing', 'R&D', 'Supply Chain', 'Quality']
+LOCATIONS = ['Shanghai', 'Beijing', 'Guangzhou', 'Suzhou', 'Chengdu', 'Wuhan']
+MODELS = {
+    'Dell': ['Latitude 5420', 'Latitude 7430', 'OptiPlex 7090', 'Precision 3571'],
+    'Dell Inc.': ['Latitude 5430', 'OptiPlex 5000'],
+    'DELL': ['Latitude 3420'],
+    'Lenovo': ['ThinkPad X1 Carbon', 'ThinkPad T14', 'ThinkCentre M70q'],
+    'HP': ['EliteBook 840 G8', 'ProDesk 400 G7'],
+    'Apple': ['MacBook Pro 14', 'MacBook Air M2'],
+    '': ['Unknown']
+}
+MANUFACTURER_WEIGHTS = [30, 15, 10, 20, 15, 5, 5]
+BAND_WEIGHTS = [2, 3, 5, 8, 12, 15, 15, 13, 10, 7, 5, 3, 1, 1]
+
+
+def random_name(rng):
+    return rng.choice(SURNAMES) + ''.join(rng.choices(GIVEN_NAMES, k=rng.randint(1, 2)))
+
+
+def random_tag(rng, length=7):
+    return ''.join(rng.choices(string.ascii_uppercase + string.digits, k=length))
+
+
+def unique_values(count, factory, rng):
+    values = set()
+    while len(values) < count:
+        values.add(factory(rng))
+    values = sorted(values)
+    rng.shuffle(values)
+    return values
+
+
+def generate_employees(count, rng):
+    emails = unique_values(count, random_email, rng)
+    return [{
+        'employee_id': str(100000 + index),
+        'name': random_name(rng),
+        'email': email,
+        'band': rng.choices(range(1, 15), weights=BAND_WEIGHTS)[0]
+    } for index, email in enumerate(emails)]
+
+
+def noisy_email(email, rng, noise=0.1):
+    value = rng.random()
+    if value < noise / 2:
+        return f' {email.upper()} '
+    if value < noise * 0.8:
+        return email.lower()
+    if value < noise:
+        return email + rng.choice([';', '.', ' ;'])
+    return email
+
+
+def random_date(rng, year, month=None):
+    month = month or rng.randint(1, 12)
+    return datetime.datetime(year, month, rng.randint(1, 28))
+
+
+def random_manufacturer(rng):
+    return rng.choices(list(MODELS), weights=MANUFACTURER_WEIGHTS)[0]
+
+
+def write_report(path, dataframe, sheet_name):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open_excel_writer(path) as writer:
+        export_dataframe_to_excel(writer, dataframe, sheet_name)
+
+
+def write_asset_report(path, rows, rng, sheet_name='AssetSummary'):
+    employees = generate_employees(max(10, rows // 3), rng)
+    serial_numbers = unique_values(rows, random_tag, rng)
+    records = []
+    for index in range(rows):
+        serial_number = serial_numbers[index]
+        if records and rng.random() < 0.03:
+            serial_number = rng.choice(records)['SN号']
+        elif rng.random() < 0.01:
+            serial_number = ''
+        manufacturer = random_manufacturer(rng)
+        user = rng.choice(employees) if rng.random() < 0.85 else None
+        owner = rng.choice(employees) if rng.random() < 0.35 else None
+        records.append({
+            'SN号': serial_number,
+            '资产编号': f'CN-IT-{index:07d}',
+            '规格型号': rng.choice(MODELS[manufacturer]),
+            'Manufacturer': manufacturer,
+            'User邮箱': noisy_email(user['email'], rng) if user else '',
+            'User Band': user['band'] if user and rng.random() > 0.03 else '',
+            'Owner邮箱': noisy_email(owner['email'], rng) if owner else '',
+            'Owner Band': owner['band'] if owner and rng.random() > 0.03 else '',
+            '部门': rng.choice(DEPARTMENTS),
+            '位置': rng.choice(LOCATIONS),
+            '购买日期': random_date(rng, rng.randint(2017, 2024)),
+            '状态': rng.choices(['在用', '闲置', '维修'], weights=[90, 8, 2])[0]
+        })
+    write_report(path, pd.DataFrame(records), sheet_name)
+    return [employee['email'] for employee in employees]
+
+
+def write_return_report(path, rows, rng, target_month, year=None):
+    year = year or datetime.datetime.now().year
+    employees = generate_employees(max(5, rows // 2), rng)
+    serial_numbers = unique_values(rows, random_tag, rng)
+    records = []
+    for employee in employees:
+        if len(records) >= rows:
+            break
+        return_date = random_date(rng, year, target_month if rng.random() < 0.3 else None)
+        handover_date = return_date if rng.random() < 0.5 else None
+        resignation_date = return_date if handover_date is None else return_date - datetime.timedelta(
+            days=rng.randint(0, 20))
+        for _ in range(min(rng.randint(1, 5), rows - len(records))):
+            records.append({
+                '员工号': employee['employee_id'],
+                '中文名': employee['name'],
+                '员工邮箱': noisy_email(employee['email'], rng, noise=0.05).strip(' ;.'),
+                '部门': rng.choice(DEPARTMENTS),
+                '离职日期': resignation_date,
+                '交接日期': handover_date,
+                '型号': rng.choice(MODELS[random_manufacturer(rng)]),
+                '资产号': f'{len(records) + 1000000}',
+                '序列号': serial_numbers[len(records)],
+                '归还情况': rng.choices(['待归还', '已归还', '待归还(部分)'], weights=[60, 35, 5])[0],
+                '备注': rng.choice(['', '', '', '已联系', '外地员工'])
+            })
+    write_report(path, pd.DataFrame(records), 'List')
+    return [employee['email'] for employee in employees]
+
+
+def write_quarterly_report(path, rows, rng):
+    employees = generate_employees(max(5, rows // 2), rng)
+    serial_numbers = unique_values(rows, random_tag, rng)
+    records = []
+    while len(records) < rows:
+        employee = employees[len(records) % len(employees)]
+        for _ in range(min(rng.randint(1, 4), rows - len(records))):
+            serial_number = serial_numbers[len(records)]
+            records.append({
+                '资产号': f'{len(records) + 2000000}',
+                '型号': rng.choice(MODELS[random_manufacturer(rng)]),
+                '序列号': rng.choice([serial_number, serial_number.lower(), f' {serial_number} ']),
+                '邮件': noisy_email(employee['email'], rng, noise=0.05).strip(' ;.'),
+                '姓名': employee['name'] + (' ' if rng.random() < 0.05 else ''),
+                '部门': rng.choice(DEPARTMENTS),
+                '位置': rng.choice(LOCATIONS)
+            })
+    write_report(path, pd.DataFrame(records), 'Sheet1')
+    return [employee['email'] for employee in employees]
+
+
+def write_mfa_user_list(folder, rows, rng, msg_size=48 * 1024):
+    employees = generate_employees(max(10, rows + rows // 10), rng)
+    users, managers = employees[:rows], employees[rows:]
+    records = [{
+        'User': noisy_email(user['email'], rng, noise=0.05).strip(' ;.'),
+        'Display Name': user['name'],
+        'Department': rng.choice(DEPARTMENTS),
+        'Line Manager': rng.choice(managers)['email']
+    } for user in users]
+    write_report(Path(folder, 'MFA User List.xlsx'), pd.DataFrame(records), 'Sheet1')
+    Path(folder, 'Workday Phone Update.msg').write_bytes(rng.randbytes(msg_size))
+    return [user['email'] for user in users]
+
+
+def write_reports(folder, rows, seed=42, target_month=None):
+    rng = random.Random(seed)
+    target_month = target_month or datetime.datetime.now().month
+    folder = Path(folder)
+    return {
+        'asset': write_asset_report(Path(folder, 'asset', 'asset report.xlsx'), rows, rng),
+        'return': write_return_report(Path(folder, 'return', 'return report.xlsx'), rows, rng, target_month),
+        'quarterly': write_quarterly_report(Path(folder, 'quarterly', 'quarterly', 'inventory.xlsx'), rows, rng),
+        'mfa': write_mfa_user_list(Path(folder, 'mfa'), rows, rng)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write synthetic asset, return, quarterly and MFA reports')
+    parser.add_argument('folder')
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--month', type=int, default=None, help='month the return report targets')
+    args = parser.parse_args()
+
+    employees = write_reports(args.folder, args.rows, args.seed, args.month)
+    for name, emails in employees.items():
+        print(f'{name:>10}: {args.rows} rows, {len(emails)} employees')
+
+
+if __name__ == '__main__':
+    main()
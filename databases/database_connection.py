@@ -1,25 +1,88 @@
 import os
+import threading
+from contextlib import contextmanager
 from urllib.parse import quote
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, func
 from sqlalchemy.orm import sessionmaker
 
-Session = sessionmaker()
+from utils.logger import Logger
+from utils.metrics import increment, span
+
+_engines = {}
+_session_factories = {}
+_registry_lock = threading.Lock()
+CASE_INSENSITIVE_DIALECTS = ('mssql',)
+
+
+def iterate_chunks(values, chunk_size=None):
+    values = list(values)
+    chunk_size = chunk_size or int(os.getenv('DATABASE_QUERY_CHUNK_SIZE', '500'))
+    for start in range(0, len(values), chunk_size):
+        yield values[start:start + chunk_size]
+
+
+def _create_engine(database_name):
+    db_url = os.getenv(f'{database_name}_URL')
+    if db_url:
+        return create_engine(db_url, echo=False)
+    adapter = os.getenv(f'{database_name}_ADAPTER')
+    host = os.getenv(f'{database_name}_HOST')
+    port = os.getenv(f'{database_name}_PORT')
+    user = os.getenv(f'{database_name}_USER')
+    password = os.getenv(f'{database_name}_PASSWORD')
+    database_str = os.getenv(f'{database_name}_DATABASE_STR')
+    db_uri = f'{adapter}://{user}:%s@{host}:{port}/{database_str}' % quote(password)
+    return create_engine(db_uri, echo=False,
+                         pool_size=int(os.getenv(f'{database_name}_POOL_SIZE', '5')),
+                         pool_pre_ping=os.getenv(f'{database_name}_POOL_PRE_PING', 'true').lower() == 'true',
+                         pool_recycle=int(os.getenv(f'{database_name}_POOL_RECYCLE', '3600')))
+
+
+def get_session_factory(database_name):
+    with _registry_lock:
+        if database_name not in _session_factories:
+            _engines[database_name] = _create_engine(database_name)
+            _session_factories[database_name] = sessionmaker(bind=_engines[database_name])
+        return _session_factories[database_name]
+
+
+def get_engine(database_name):
+    get_session_factory(database_name)
+    return _engines[database_name]
+
+
+def dispose_engines():
+    with _registry_lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+        _session_factories.clear()
 
 
 class DatabaseConnection(object):
     def __init__(self, database_name: str):
         self.database_name = database_name.upper()
-        self.session = self._create_session()
-
-    def _create_session(self):
-        adapter = os.getenv(f'{self.database_name}_ADAPTER')
-        host = os.getenv(f'{self.database_name}_HOST')
-        port = os.getenv(f'{self.database_name}_PORT')
-        user = os.getenv(f'{self.database_name}_USER')
-        password = os.getenv(f'{self.database_name}_PASSWORD')
-        database_str = os.getenv(f'{self.database_name}_DATABASE_STR')
-        db_uri = f'{adapter}://{user}:%s@{host}:{port}/{database_str}' % quote(password)
-        engine = create_engine(db_uri, echo=False)
-        Session.configure(bind=engine)
-        return Session()
+        self.session_factory = get_session_factory(self.database_name)
+        self.email_lookup = os.getenv(f'{self.database_name}_EMAIL_LOOKUP', 'lower').lower()
+        dialect = get_engine(self.database_name).dialect.name
+        if self.email_lookup == 'normalized' and dialect not in CASE_INSENSITIVE_DIALECTS:
+            Logger().warning(msg=f'{self.database_name}_EMAIL_LOOKUP=normalized needs a case-insensitive collation, '
+                                 f'falling back to lower on {dialect}')
+            self.email_lookup = 'lower'
+
+    @property
+    def session(self):
+        return self.session_factory()
+
+    @contextmanager
+    def round_trip(self, name):
+        increment('db_round_trips')
+        with span(f'db.{self.database_name.lower()}.{name}'):
+            yield
+
+    def email_filter(self, column, emails):
+        emails = [email.strip().lower() for email in emails]
+        if self.email_lookup == 'normalized':
+            return column.in_(emails)
+        return func.lower(column).in_(emails)
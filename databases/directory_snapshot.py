@@ -0,0 +1,109 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+
+from utils.logger import Logger
+
+
+def is_snapshot_enabled():
+    return os.getenv('EMP_SNAPSHOT_ENABLED', 'false').lower() == 'true'
+
+
+class DirectorySnapshot(object):
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+                cls._instance._setup()
+        return cls._instance
+
+    def _setup(self):
+        folder = Path('/', *os.getenv('EMP_SNAPSHOT_FOLDER').split(',')).resolve()
+        folder.mkdir(parents=True, exist_ok=True)
+        self.path = Path(folder, os.getenv('EMP_SNAPSHOT_FILE', 'directory.sqlite'))
+        self.ttl = int(os.getenv('EMP_SNAPSHOT_TTL', '86400'))
+        self.lock = threading.Lock()
+        self.bands = None
+        self.vips = None
+        with closing(self._connect()) as connection, connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS employee_band (email TEXT PRIMARY KEY, band TEXT)')
+            connection.execute('CREATE TABLE IF NOT EXISTS china_vip (id INTEGER PRIMARY KEY, email TEXT NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_china_vip_email ON china_vip (email)')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS sync_state (source TEXT PRIMARY KEY, synced_at REAL, watermark INTEGER)')
+
+    def _connect(self):
+        return sqlite3.connect(self.path)
+
+    def _get_sync_state(self, connection, source):
+        row = connection.execute('SELECT synced_at, watermark FROM sync_state WHERE source = ?', (source,)).fetchone()
+        return row if row else (None, None)
+
+    def _set_sync_state(self, connection, source, watermark=None):
+        connection.execute('INSERT OR REPLACE INTO sync_state (source, synced_at, watermark) VALUES (?, ?, ?)',
+                           (source, time.time(), watermark))
+
+    def _is_stale(self, synced_at):
+        return synced_at is None or time.time() - synced_at > self.ttl
+
+    def _refresh_bands(self, fetch_bands):
+        with closing(self._connect()) as connection, connection:
+            synced_at, _ = self._get_sync_state(connection, 'employee_band')
+            if not self._is_stale(synced_at):
+                return
+            try:
+                rows = fetch_bands()
+            except Exception as e:
+                if synced_at is None:
+                    raise
+                Logger().warning(msg=f'Failed to refresh employee band snapshot, serving stale data: {e}')
+                return
+            connection.execute('DELETE FROM employee_band')
+            connection.executemany('INSERT OR IGNORE INTO employee_band (email, band) VALUES (?, ?)',
+                                   ((email.lower(), band) for email, band in rows if email))
+            self._set_sync_state(connection, 'employee_band')
+
+    def _refresh_vips(self, fetch_vips, count_vips):
+        with closing(self._connect()) as connection, connection:
+            synced_at, watermark = self._get_sync_state(connection, 'china_vip')
+            if not self._is_stale(synced_at):
+                return
+            try:
+                rows = fetch_vips(watermark)
+                connection.executemany('INSERT OR REPLACE INTO china_vip (id, email) VALUES (?, ?)',
+                                       ((vip_id, email.lower()) for vip_id, email in rows))
+                local_count, = connection.execute('SELECT COUNT(*) FROM china_vip').fetchone()
+                if local_count != count_vips():
+                    connection.execute('DELETE FROM china_vip')
+                    connection.executemany('INSERT INTO china_vip (id, email) VALUES (?, ?)',
+                                           ((vip_id, email.lower()) for vip_id, email in fetch_vips(None)))
+            except Exception as e:
+                if synced_at is None:
+                    raise
+                connection.rollback()
+                Logger().warning(msg=f'Failed to refresh china vip snapshot, serving stale data: {e}')
+                return
+            watermark, = connection.execute('SELECT MAX(id) FROM china_vip').fetchone()
+            self._set_sync_state(connection, 'china_vip', watermark)
+
+    def get_bands(self, fetch_bands):
+        with self.lock:
+            if self.bands is None:
+                self._refresh_bands(fetch_bands)
+                with closing(self._connect()) as connection:
+                    self.bands = dict(connection.execute('SELECT email, band FROM employee_band'))
+            return self.bands
+
+    def get_vips(self, fetch_vips, count_vips):
+        with self.lock:
+            if self.vips is None:
+                self._refresh_vips(fetch_vips, count_vips)
+                with closing(self._connect()) as connection:
+                    self.vips = {email for email, in connection.execute('SELECT email FROM china_vip')}
+            return self.vips
@@ -1,9 +1,8 @@
 import os
 from contextlib import contextmanager
 
-from sqlalchemy import func
-
-from databases.database_connection import DatabaseConnection
+from databases.database_connection import DatabaseConnection, iterate_chunks
+from databases.directory_snapshot import DirectorySnapshot, is_snapshot_enabled
 from databases.models import Employee
 
 
@@ -18,21 +17,51 @@ def database_session(session):
 class EMPCollectDatabase(DatabaseConnection):
     def __init__(self):
         super().__init__('emp_collect')
+        self.snapshot = DirectorySnapshot() if is_snapshot_enabled() else None
+
+    def fetch_bands(self):
+        with database_session(self.session) as session:
+            with self.round_trip('fetch_bands'):
+                return session.query(Employee.email_primary_work, Employee.band).all()
 
     def is_high_band(self, email):
+        if self.snapshot is not None:
+            return self.high_bands([email])[email]
         with database_session(self.session) as session:
-            result = session.query(Employee.band).filter(
-                func.lower(Employee.email_primary_work) == func.lower(email)).first()
+            with self.round_trip('is_high_band'):
+                result = session.query(Employee.band).filter(
+                    self.email_filter(Employee.email_primary_work, [email])).first()
             if result:
                 band_value = self.safe_string_to_int(result[0], default=0)
-                min_ignore_band = int(os.getenv('QUARTERLY_ASSET_MIN_IGNORE_BAND'))
-                if band_value >= min_ignore_band:
-                    return True
-                else:
-                    return False
+                return self.is_band_ignored(band_value)
             else:
                 return False
 
+    def bands_for(self, emails):
+        emails = list(dict.fromkeys(emails))
+        if self.snapshot is not None:
+            snapshot_bands = self.snapshot.get_bands(self.fetch_bands)
+            return {email: self.safe_string_to_int(snapshot_bands[email.lower()], default=0) for email in emails if
+                    email.lower() in snapshot_bands}
+        bands = {}
+        with database_session(self.session) as session:
+            for chunk in iterate_chunks({email.lower() for email in emails}):
+                query = session.query(Employee.email_primary_work, Employee.band).filter(
+                    self.email_filter(Employee.email_primary_work, chunk))
+                with self.round_trip('bands_for'):
+                    rows = query.all()
+                for email, band in rows:
+                    bands.setdefault(email.lower(), self.safe_string_to_int(band, default=0))
+        return {email: bands[email.lower()] for email in emails if email.lower() in bands}
+
+    def high_bands(self, emails):
+        bands = self.bands_for(emails)
+        return {email: email in bands and self.is_band_ignored(bands[email]) for email in emails}
+
+    def is_band_ignored(self, band_value):
+        min_ignore_band = int(os.getenv('QUARTERLY_ASSET_MIN_IGNORE_BAND'))
+        return band_value >= min_ignore_band
+
     def safe_string_to_int(self, value, default=None):
         try:
             if value is None:
@@ -1,6 +1,9 @@
 from contextlib import contextmanager
 
-from databases.database_connection import DatabaseConnection
+from sqlalchemy import func
+
+from databases.database_connection import DatabaseConnection, iterate_chunks
+from databases.directory_snapshot import DirectorySnapshot, is_snapshot_enabled
 from databases.models import ChinaVIP
 
 
@@ -15,12 +18,42 @@ def database_session(session):
 class EMPInfoDatabase(DatabaseConnection):
     def __init__(self):
         super().__init__('emp_info')
+        self.snapshot = DirectorySnapshot() if is_snapshot_enabled() else None
+
+    def fetch_vips(self, since_id=None):
+        with database_session(self.session) as session:
+            query = session.query(ChinaVIP.id, ChinaVIP.email)
+            if since_id is not None:
+                query = query.filter(ChinaVIP.id > since_id)
+            with self.round_trip('fetch_vips'):
+                return query.all()
+
+    def count_vips(self):
+        with database_session(self.session) as session:
+            with self.round_trip('count_vips'):
+                return session.query(func.count(ChinaVIP.id)).scalar()
 
     def is_china_vip(self, email):
+        if self.snapshot is not None:
+            return email.lower() in self.snapshot.get_vips(self.fetch_vips, self.count_vips)
         with database_session(self.session) as session:
-            query = session.query(ChinaVIP).filter(ChinaVIP.email.ilike(email))
-            result = query.first()
+            query = session.query(ChinaVIP).filter(self.email_filter(ChinaVIP.email, [email]))
+            with self.round_trip('is_china_vip'):
+                result = query.first()
             if result:
                 return True
             else:
                 return False
+
+    def china_vips(self, emails):
+        emails = list(dict.fromkeys(emails))
+        if self.snapshot is not None:
+            vips = self.snapshot.get_vips(self.fetch_vips, self.count_vips)
+            return {email: email.lower() in vips for email in emails}
+        vips = set()
+        with database_session(self.session) as session:
+            for chunk in iterate_chunks({email.lower() for email in emails}):
+                query = session.query(ChinaVIP.email).filter(self.email_filter(ChinaVIP.email, chunk))
+                with self.round_trip('china_vips'):
+                    vips.update(email.lower() for email, in query)
+        return {email: email.lower() in vips for email in emails}
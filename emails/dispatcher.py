@@ -0,0 +1,72 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from utils.email_logger import EmailSendingLogger
+
+
+class RateLimiter(object):
+    def __init__(self, per_second=0, per_minute=0):
+        self.interval = 1 / per_second if per_second else 0
+        self.per_minute = per_minute
+        self.next_time = 0.0
+        self.window = deque()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            while True:
+                now = time.monotonic()
+                wait = self.next_time - now if self.interval else 0
+                if self.per_minute:
+                    while self.window and now - self.window[0] >= 60:
+                        self.window.popleft()
+                    if len(self.window) >= self.per_minute:
+                        wait = max(wait, 60 - (now - self.window[0]))
+                if wait <= 0:
+                    break
+                time.sleep(wait)
+            self.next_time = now + self.interval
+            if self.per_minute:
+                self.window.append(now)
+
+
+class NotificationDispatcher(object):
+    def __init__(self, workers=None, rate_per_second=None, rate_per_minute=None):
+        self.workers = workers or int(os.getenv('NOTIFICATION_WORKERS', '1'))
+        if rate_per_second is None:
+            rate_per_second = float(os.getenv('NOTIFICATION_RATE_PER_SECOND', '0'))
+        if rate_per_minute is None:
+            rate_per_minute = int(os.getenv('NOTIFICATION_RATE_PER_MINUTE', '0'))
+        self.rate_limiter = RateLimiter(rate_per_second, rate_per_minute)
+
+    def _run(self, task):
+        self.rate_limiter.acquire()
+        with EmailSendingLogger().collect() as log_entries:
+            task()
+        return log_entries
+
+    def dispatch(self, tasks, on_result=None):
+        logger = EmailSendingLogger()
+        results = []
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self._run, task) for task in tasks]
+            try:
+                for index, future in enumerate(futures):
+                    results.append(future.result())
+                    logger.extend(results[-1])
+                    if on_result is not None:
+                        on_result(index, results[-1])
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                wait(futures)
+                for index, future in enumerate(futures[len(results):], len(results)):
+                    if not future.cancelled() and future.exception() is None:
+                        logger.extend(future.result())
+                        if on_result is not None:
+                            on_result(index, future.result())
+                raise
+        return results
@@ -1,15 +1,28 @@
 import datetime
+import functools
 import os
 import re
 import smtplib
-from email.mime.image import MIMEImage
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 
 import pandas as pd
 
+from emails.mime_parts import InlineImageCache
+from emails.smtp_pool import SMTPConnectionPool
+from emails.templates import TemplateRegistry
 from utils.email_logger import EmailSendingLogger
 from utils.logger import Logger
+from utils.metrics import increment, span, timed
+
+
+@functools.lru_cache(maxsize=None)
+def generate_it_contact():
+    df = pd.read_csv(os.path.join(os.path.dirname(__file__), 'it_contact.csv'), sep=',')
+    df['驻场工程师'] = df['驻场工程师'].str.replace(',', '<br>')
+    df['联系电话'] = df['联系电话'].str.replace(',', '<br>')
+    df['联系邮箱'] = df['联系邮箱'].str.replace(',', '<br>')
+    return df.to_html(index=False, escape=False)
 
 
 class Emails(object):
@@ -18,10 +31,7 @@ class Emails(object):
         self.port = int(os.getenv('SMTP_PORT'))
         self.sender_email = os.getenv(f'{name.upper()}_EMAIL_SENDER')
         self.subject = os.getenv(f'{name.upper()}_EMAIL_SUBJECT')
-        with open(os.path.join(os.path.dirname(__file__), 'signature.png'), 'rb') as file:
-            self.signature_img = file.read()
-        with open(os.path.join(os.path.dirname(__file__), f'{name}_template.html'), 'r', encoding='UTF-8') as file:
-            self.html = file.read()
+        self.template = TemplateRegistry().get_template(name)
 
     def extract_name(self, email, is_firstname=False):
         username, domain = email.split('@')
@@ -37,13 +47,18 @@ class Emails(object):
         else:
             return full_name
 
+    @timed('send')
     def send_email(self, sender, to: list, email_content, cc: list = None, bcc: list = None, record_sent: bool = False):
         receivers = [item for sublist in (to, cc, bcc) if sublist is not None for item in sublist]
         Logger().info(msg=f"Will send email to {', '.join(receivers)}")
         logger = EmailSendingLogger()
         try:
-            with smtplib.SMTP(self.smtp_server, self.port) as server:
-                send_errs = server.sendmail(from_addr=sender, to_addrs=receivers, msg=email_content.as_string())
+            content = email_content.as_string()
+            with span('smtp'):
+                send_errs = SMTPConnectionPool().sendmail(self.smtp_server, self.port, sender, receivers, content)
+            increment('bytes_sent', len(content))
+            failed_receivers = [key for key in send_errs if key != os.getenv('RETURN_EMAIL_CC')]
+            increment('messages_failed' if failed_receivers else 'messages_sent')
             if not send_errs:
                 Logger().info(msg=f"Successfully sent email to {', '.join(receivers)}")
                 if record_sent:
@@ -61,6 +76,7 @@ class Emails(object):
                                               error_code=code, error_message=error_message)
 
         except smtplib.SMTPRecipientsRefused as e:
+            increment('messages_failed')
             for recipient, (code, message) in e.recipients.items():
                 error_message = message.decode('utf-8')
                 Logger().error(msg=f'Failed to send email to {recipient}: {code} - {error_message}')
@@ -75,22 +91,21 @@ class Emails(object):
         message["From"] = self.sender_email
         message["To"] = receiver
         html_part = MIMEMultipart("related")
-        self.html = self.html.replace('${RECEIVER}', self.extract_name(receiver, is_firstname=True))
-        self.html = self.html.replace('${ASSET_URL}', os.getenv('ASSET_EMAIL_ASSET_URL'))
-        self.html = self.html.replace('${IT_SUPPORT_EMAIL}', os.getenv('ASSET_EMAIL_IT_SUPPORT_MAILBOX'))
-        self.html = self.html.replace('${EMAIL_SUBJECT}', subject)
-        self.html = self.html.replace('${TABLE}', info)
-        self.html = self.html.replace('${SENDER}', self.extract_name(self.sender_email))
-        self.html = self.html.replace('${SENDER_TITLE}', os.getenv('ASSET_EMAIL_SENDER_TITLE'))
-        self.html = self.html.replace('${SENDER_ADDRESS}',
-                                      '<br>'.join(os.getenv('ASSET_EMAIL_SENDER_ADDRESS').split(';')))
-        html_part.attach(MIMEText(self.html, "html"))
-        signature_image = MIMEImage(self.signature_img)
-        signature_image.add_header('Content-ID', '<signature>')
-        html_part.attach(signature_image)
+        html = self.template.render({
+            'RECEIVER': self.extract_name(receiver, is_firstname=True),
+            'ASSET_URL': os.getenv('ASSET_EMAIL_ASSET_URL'),
+            'IT_SUPPORT_EMAIL': os.getenv('ASSET_EMAIL_IT_SUPPORT_MAILBOX'),
+            'EMAIL_SUBJECT': subject,
+            'TABLE': info,
+            'SENDER': self.extract_name(self.sender_email),
+            'SENDER_TITLE': os.getenv('ASSET_EMAIL_SENDER_TITLE'),
+            'SENDER_ADDRESS': '<br>'.join(os.getenv('ASSET_EMAIL_SENDER_ADDRESS').split(';'))
+        })
+        html_part.attach(MIMEText(html, "html"))
+        html_part.attach(InlineImageCache().get('<signature>'))
         message.attach(html_part)
 
-        self.send_email(sender=self.sender_email, to=[receiver], email_content=message)
+        self.send_email(sender=self.sender_email, to=[receiver], email_content=message, record_sent=True)
 
     def send_return_email(self, emp_id, name, email, date, info):
         message = MIMEMultipart("alternative")
@@ -99,15 +114,15 @@ class Emails(object):
         message["To"] = email
         message["Cc"] = os.getenv('RETURN_EMAIL_CC')
         html_part = MIMEMultipart("related")
-        self.html = self.html.replace('${RECEIVER}', name)
-        self.html = self.html.replace('${DATE}', date.strftime('%Y年%m月%d日'))
-        self.html = self.html.replace('${IT_CONTACT}', self.generate_it_contact())
-        self.html = self.html.replace('${TABLE}', info)
-        self.html = self.html.replace('${IT_SUPPORT_EMAIL}', os.getenv('RETURN_EMAIL_IT_SUPPORT_MAILBOX'))
-        html_part.attach(MIMEText(self.html, "html"))
-        signature_image = MIMEImage(self.signature_img)
-        signature_image.add_header('Content-ID', '<signature>')
-        html_part.attach(signature_image)
+        html = self.template.render({
+            'RECEIVER': name,
+            'DATE': date.strftime('%Y年%m月%d日'),
+            'IT_CONTACT': self.generate_it_contact(),
+            'TABLE': info,
+            'IT_SUPPORT_EMAIL': os.getenv('RETURN_EMAIL_IT_SUPPORT_MAILBOX')
+        })
+        html_part.attach(MIMEText(html, "html"))
+        html_part.attach(InlineImageCache().get('<signature>'))
         message.attach(html_part)
 
         self.send_email(sender=self.sender_email, to=[email], cc=[os.getenv('RETURN_EMAIL_CC')], email_content=message,
@@ -119,11 +134,9 @@ class Emails(object):
         message["From"] = self.sender_email
         message["To"] = self.sender_email
         html_part = MIMEMultipart("related")
-        self.html = self.html.replace('${TABLE}', info)
-        html_part.attach(MIMEText(self.html, "html"))
-        signature_image = MIMEImage(self.signature_img)
-        signature_image.add_header('Content-ID', '<signature>')
-        html_part.attach(signature_image)
+        html = self.template.render({'TABLE': info})
+        html_part.attach(MIMEText(html, "html"))
+        html_part.attach(InlineImageCache().get('<signature>'))
         message.attach(html_part)
         if excel_attachment is not None:
             message.attach(excel_attachment)
@@ -136,11 +149,9 @@ class Emails(object):
         message["From"] = self.sender_email
         message["To"] = self.sender_email
         html_part = MIMEMultipart("related")
-        self.html = self.html.replace('${TABLE}', info)
-        html_part.attach(MIMEText(self.html, "html"))
-        signature_image = MIMEImage(self.signature_img)
-        signature_image.add_header('Content-ID', '<signature>')
-        html_part.attach(signature_image)
+        html = self.template.render({'TABLE': info})
+        html_part.attach(MIMEText(html, "html"))
+        html_part.attach(InlineImageCache().get('<signature>'))
         message.attach(html_part)
         if excel_attachment is not None:
             message.attach(excel_attachment)
@@ -148,11 +159,7 @@ class Emails(object):
         self.send_email(sender=self.sender_email, to=[self.sender_email], email_content=message)
 
     def generate_it_contact(self):
-        df = pd.read_csv(os.path.join(os.path.dirname(__file__), 'it_contact.csv'), sep=',')
-        df['驻场工程师'] = df['驻场工程师'].str.replace(',', '<br>')
-        df['联系电话'] = df['联系电话'].str.replace(',', '<br>')
-        df['联系邮箱'] = df['联系邮箱'].str.replace(',', '<br>')
-        return df.to_html(index=False, escape=False)
+        return generate_it_contact()
 
     def extract_year_quarter(self):
         pattern = r'(\d{4})(Q\d)'
@@ -174,26 +181,18 @@ class Emails(object):
         message["To"] = email
         message["Cc"] = os.getenv('QUARTERLY_ASSET_EMAIL_CC')
         html_part = MIMEMultipart("related")
-        self.html = self.html.replace('${RECEIVER}', name)
-        self.html = self.html.replace('${YEAR}', year)
-        self.html = self.html.replace('${QUARTER}', quarter)
-        self.html = self.html.replace('${TABLE}', info)
-        self.html = self.html.replace('${ASSET_URL}', os.getenv('QUARTERLY_ASSET_EMAIL_ASSET_URL'))
-        self.html = self.html.replace('${IT_SUPPORT_EMAIL}', os.getenv('QUARTERLY_ASSET_EMAIL_IT_SUPPORT_MAILBOX'))
-        html_part.attach(MIMEText(self.html, "html"))
-        signature_image = MIMEImage(self.signature_img)
-        signature_image.add_header('Content-ID', '<signature>')
-        html_part.attach(signature_image)
-        with open(os.path.join(os.path.dirname(__file__), 'confirm.png'), 'rb') as file:
-            confirm_img = file.read()
-        confirm_image = MIMEImage(confirm_img)
-        confirm_image.add_header('Content-ID', '<confirm>')
-        html_part.attach(confirm_image)
-        with open(os.path.join(os.path.dirname(__file__), 'feedback.png'), 'rb') as file:
-            feedback_img = file.read()
-        feedback_image = MIMEImage(feedback_img)
-        feedback_image.add_header('Content-ID', '<feedback>')
-        html_part.attach(feedback_image)
+        html = self.template.render({
+            'RECEIVER': name,
+            'YEAR': year,
+            'QUARTER': quarter,
+            'TABLE': info,
+            'ASSET_URL': os.getenv('QUARTERLY_ASSET_EMAIL_ASSET_URL'),
+            'IT_SUPPORT_EMAIL': os.getenv('QUARTERLY_ASSET_EMAIL_IT_SUPPORT_MAILBOX')
+        })
+        html_part.attach(MIMEText(html, "html"))
+        html_part.attach(InlineImageCache().get('<signature>'))
+        html_part.attach(InlineImageCache().get('<confirm>'))
+        html_part.attach(InlineImageCache().get('<feedback>'))
         message.attach(html_part)
 
         self.send_email(sender=self.sender_email, to=[email], cc=[os.getenv('QUARTERLY_ASSET_EMAIL_CC')],
@@ -205,11 +204,9 @@ class Emails(object):
         message["From"] = self.sender_email
         message["To"] = self.sender_email
         html_part = MIMEMultipart("related")
-        self.html = self.html.replace('${TABLE}', info)
-        html_part.attach(MIMEText(self.html, "html"))
-        signature_image = MIMEImage(self.signature_img)
-        signature_image.add_header('Content-ID', '<signature>')
-        html_part.attach(signature_image)
+        html = self.template.render({'TABLE': info})
+        html_part.attach(MIMEText(html, "html"))
+        html_part.attach(InlineImageCache().get('<signature>'))
         message.attach(html_part)
         if excel_attachment is not None:
             message.attach(excel_attachment)
@@ -222,11 +219,9 @@ class Emails(object):
         message["From"] = self.sender_email
         message["To"] = self.sender_email
         html_part = MIMEMultipart("related")
-        self.html = self.html.replace('${TABLE}', info)
-        html_part.attach(MIMEText(self.html, "html"))
-        signature_image = MIMEImage(self.signature_img)
-        signature_image.add_header('Content-ID', '<signature>')
-        html_part.attach(signature_image)
+        html = self.template.render({'TABLE': info})
+        html_part.attach(MIMEText(html, "html"))
+        html_part.attach(InlineImageCache().get('<signature>'))
         message.attach(html_part)
         if excel_attachment is not None:
             message.attach(excel_attachment)
@@ -239,13 +234,15 @@ class Emails(object):
         message["From"] = self.sender_email
         message["To"] = email
         html_part = MIMEMultipart("related")
-        self.html = self.html.replace('${COLLEAGUE}', self.extract_name(email, is_firstname=True))
-        self.html = self.html.replace('${ATTACHMENT_URL}', os.getenv('MFA_REQUEST_ATTACHMENT_URL'))
-        self.html = self.html.replace('${ANDROID_URL}', os.getenv('MFA_REQUEST_ANDROID_URL'))
-        self.html = self.html.replace('${IOS_URL}', os.getenv('MFA_REQUEST_IOS_URL'))
-        self.html = self.html.replace('${CONTACT_URL}', os.getenv('MFA_REQUEST_CONTACT_URL'))
-        self.html = self.html.replace('${CONTACT_EMAIL}', os.getenv('MFA_REQUEST_CONTACT_EMAIL'))
-        html_part.attach(MIMEText(self.html, "html"))
+        html = self.template.render({
+            'COLLEAGUE': self.extract_name(email, is_firstname=True),
+            'ATTACHMENT_URL': os.getenv('MFA_REQUEST_ATTACHMENT_URL'),
+            'ANDROID_URL': os.getenv('MFA_REQUEST_ANDROID_URL'),
+            'IOS_URL': os.getenv('MFA_REQUEST_IOS_URL'),
+            'CONTACT_URL': os.getenv('MFA_REQUEST_CONTACT_URL'),
+            'CONTACT_EMAIL': os.getenv('MFA_REQUEST_CONTACT_EMAIL')
+        })
+        html_part.attach(MIMEText(html, "html"))
         message.attach(html_part)
         if msg_attachment is not None:
             message.attach(msg_attachment)
@@ -259,11 +256,9 @@ class Emails(object):
         message["From"] = self.sender_email
         message["To"] = self.sender_email
         html_part = MIMEMultipart("related")
-        self.html = self.html.replace('${TABLE}', info)
-        html_part.attach(MIMEText(self.html, "html"))
-        signature_image = MIMEImage(self.signature_img)
-        signature_image.add_header('Content-ID', '<signature>')
-        html_part.attach(signature_image)
+        html = self.template.render({'TABLE': info})
+        html_part.attach(MIMEText(html, "html"))
+        html_part.attach(InlineImageCache().get('<signature>'))
         message.attach(html_part)
         if excel_attachment is not None:
             message.attach(excel_attachment)
@@ -276,11 +271,9 @@ class Emails(object):
         message["From"] = self.sender_email
         message["To"] = self.sender_email
         html_part = MIMEMultipart("related")
-        self.html = self.html.replace('${TABLE}', info)
-        html_part.attach(MIMEText(self.html, "html"))
-        signature_image = MIMEImage(self.signature_img)
-        signature_image.add_header('Content-ID', '<signature>')
-        html_part.attach(signature_image)
+        html = self.template.render({'TABLE': info})
+        html_part.attach(MIMEText(html, "html"))
+        html_part.attach(InlineImageCache().get('<signature>'))
         message.attach(html_part)
         if excel_attachment is not None:
             message.attach(excel_attachment)
@@ -0,0 +1,71 @@
+import os
+import threading
+from email import encoders
+from email.header import Header
+from email.mime.base import MIMEBase
+from email.mime.image import MIMEImage
+
+from emails.templates import TemplateRegistry
+
+
+class InlineImageCache(object):
+    IMAGES = {
+        '<signature>': 'signature.png',
+        '<confirm>': 'confirm.png',
+        '<feedback>': 'feedback.png'
+    }
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+                cls._instance.parts = {}
+                cls._instance.lock = threading.Lock()
+        return cls._instance
+
+    def get(self, content_id):
+        with self.lock:
+            if content_id not in self.parts:
+                image = MIMEImage(TemplateRegistry().get_asset(self.IMAGES[content_id]))
+                image.add_header('Content-ID', content_id)
+                self.parts[content_id] = image
+            return self.parts[content_id]
+
+
+class AttachmentCache(object):
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+                cls._instance.payloads = {}
+                cls._instance.lock = threading.Lock()
+        return cls._instance
+
+    def _get_payload(self, file_path):
+        path = os.path.abspath(file_path)
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            cached = self.payloads.get(path)
+            if cached is None or cached[0] != version:
+                with open(path, 'rb') as attachment:
+                    part = MIMEBase("application", "octet-stream")
+                    part.set_payload(attachment.read())
+                encoders.encode_base64(part)
+                cached = (version, part.get_payload())
+                self.payloads[path] = cached
+            return cached[1]
+
+    def get(self, file_path, filename=None):
+        attachment = MIMEBase("application", "octet-stream")
+        attachment.set_payload(self._get_payload(file_path))
+        attachment['Content-Transfer-Encoding'] = 'base64'
+        attachment.add_header('Content-Disposition', 'attachment',
+                              filename=Header(filename or os.path.basename(file_path), 'utf-8').encode())
+        return attachment
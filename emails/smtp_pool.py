@@ -0,0 +1,107 @@
+import atexit
+import os
+import smtplib
+import threading
+
+
+class SMTPSession(object):
+    def __init__(self, smtp_server, port):
+        self.smtp_server = smtp_server
+        self.port = port
+        self.sent_count = 0
+        self.server = smtplib.SMTP(smtp_server, port)
+
+    def sendmail(self, sender, receivers, msg):
+        send_errs = self.server.sendmail(from_addr=sender, to_addrs=receivers, msg=msg)
+        self.sent_count += 1
+        return send_errs
+
+    def close(self):
+        try:
+            self.server.quit()
+        except (smtplib.SMTPException, OSError):
+            self.server.close()
+
+
+class SMTPConnectionPool(object):
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+                cls._instance.pool_size = int(os.getenv('SMTP_POOL_SIZE', '4'))
+                cls._instance.max_messages = int(os.getenv('SMTP_MAX_MESSAGES_PER_CONNECTION', '100'))
+                cls._instance.idle_sessions = {}
+                cls._instance.slots = {}
+                cls._instance.lock = threading.Lock()
+                atexit.register(cls._instance.close_all)
+        return cls._instance
+
+    def _get_slots(self, key):
+        with self.lock:
+            if key not in self.slots:
+                self.slots[key] = threading.BoundedSemaphore(self.pool_size)
+                self.idle_sessions[key] = []
+            return self.slots[key]
+
+    def _acquire(self, smtp_server, port):
+        key = (smtp_server, port)
+        self._get_slots(key).acquire()
+        with self.lock:
+            if self.idle_sessions[key]:
+                return self.idle_sessions[key].pop()
+        try:
+            return SMTPSession(smtp_server, port)
+        except BaseException:
+            self.slots[key].release()
+            raise
+
+    def _release(self, session, discard=False):
+        key = (session.smtp_server, session.port)
+        if discard or session.sent_count >= self.max_messages:
+            session.close()
+        else:
+            with self.lock:
+                self.idle_sessions[key].append(session)
+        self.slots[key].release()
+
+    def sendmail(self, smtp_server, port, sender, receivers, msg):
+        for attempt in range(2):
+            session = self._acquire(smtp_server, port)
+            try:
+                send_errs = session.sendmail(sender, receivers, msg)
+            except smtplib.SMTPServerDisconnected:
+                self._release(session, discard=True)
+                if attempt:
+                    raise
+            except smtplib.SMTPResponseException as e:
+                is_transient = 400 <= e.smtp_code < 500
+                self._release(session, discard=is_transient)
+                if attempt or not is_transient:
+                    raise
+            except smtplib.SMTPRecipientsRefused:
+                self._release(session)
+                raise
+            except smtplib.SMTPException:
+                self._release(session, discard=True)
+                raise
+            except OSError:
+                self._release(session, discard=True)
+                if attempt:
+                    raise
+            except BaseException:
+                self._release(session, discard=True)
+                raise
+            else:
+                self._release(session)
+                return send_errs
+
+    def close_all(self):
+        with self.lock:
+            sessions = [session for sessions in self.idle_sessions.values() for session in sessions]
+            for sessions in self.idle_sessions.values():
+                sessions.clear()
+        for session in sessions:
+            session.close()
@@ -0,0 +1,53 @@
+import os
+import re
+import threading
+
+from utils.metrics import timed
+
+PLACEHOLDER_PATTERN = re.compile(r'\$\{([A-Z_]+)\}')
+
+
+class EmailTemplate(object):
+    def __init__(self, source):
+        self.source = source
+        self.parts = PLACEHOLDER_PATTERN.split(source)
+        self.placeholders = {index: name for index, name in enumerate(self.parts) if index % 2 == 1}
+
+    @timed('render')
+    def render(self, values):
+        parts = list(self.parts)
+        for index, name in self.placeholders.items():
+            if name in values:
+                parts[index] = values[name]
+            else:
+                parts[index] = f'${{{name}}}'
+        return ''.join(parts)
+
+
+class TemplateRegistry(object):
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+                cls._instance.folder = os.path.dirname(__file__)
+                cls._instance.templates = {}
+                cls._instance.assets = {}
+                cls._instance.lock = threading.Lock()
+        return cls._instance
+
+    def get_template(self, name):
+        with self.lock:
+            if name not in self.templates:
+                with open(os.path.join(self.folder, f'{name}_template.html'), 'r', encoding='UTF-8') as file:
+                    self.templates[name] = EmailTemplate(file.read())
+            return self.templates[name]
+
+    def get_asset(self, filename):
+        with self.lock:
+            if filename not in self.assets:
+                with open(os.path.join(self.folder, filename), 'rb') as file:
+                    self.assets[filename] = file.read()
+            return self.assets[filename]
@@ -1,110 +1,184 @@
+import argparse
 import os
-import re
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
-import wcwidth
 from dotenv import load_dotenv
 
+from utils.excel_reader import iter_excel_report_chunks, read_excel_report
+from utils.excel_writer import export_dataframe_to_excel, export_dataframes_to_excel, open_excel_writer
+from utils.metrics import export_metrics
+from utils.pipeline import Pipeline, row_filter, transform
+from utils.report_cache import ReportCache
+from utils.report_handoff import get_handoff_path, is_excel_output_enabled, open_handoff_writer, write_handoff
+from utils.schema import fillna_series, get_category_columns, to_categorical
 
-def export_dataframe_to_excel(writer, dataframe, sheet_name):
-    workbook = writer.book
-    if sheet_name in workbook.sheetnames:
-        workbook[sheet_name].clear()
-    else:
-        workbook.add_worksheet(sheet_name)
-    header_format = workbook.add_format({
-        'bold': True,
-        'bg_color': '#5B9BD5',
-        'font_color': '#FFFFFF'
-    })
-    dataframe.to_excel(writer, sheet_name=sheet_name, index=False)
-    worksheet = writer.sheets[sheet_name]
-    columns_width = [max(len(str(col)), wcwidth.wcswidth(col)) + 4 for col in dataframe.columns]
-    for col_idx, col_name in enumerate(dataframe.columns):
-        worksheet.set_column(col_idx, col_idx, columns_width[col_idx])
-        worksheet.write(0, col_idx, col_name, header_format)
-
-
-def filter_manufacturer(dataframe, manufacturer_column, include_nan=False):
+
+def is_target_manufacturer(dataframe, manufacturer_column, include_nan=False):
     manufacturers = '|'.join(os.getenv('ASSET_REPORT_MANUFACTURER').split(','))
-    processed_df = dataframe[dataframe[manufacturer_column].str.contains(manufacturers, case=False, na=include_nan)]
-    return processed_df
+    return dataframe[manufacturer_column].str.contains(manufacturers, case=False, na=include_nan)
 
 
-def filter_band(dataframe, notification_column, band_column, band: int):
+def get_max_band(dataframe, notification_column, band_column):
     dataframe[band_column] = dataframe[band_column].apply(pd.to_numeric, errors='coerce')
-    dataframe[band_column] = dataframe.groupby(notification_column)[band_column].transform('max')
-    dataframe = dataframe[(dataframe[band_column] < band) | dataframe[band_column].isna()].reset_index(drop=True)
+    dataframe[band_column] = dataframe.groupby(notification_column, observed=True)[band_column].transform('max')
     return dataframe
 
 
-def normalize_domain(email):
-    return re.sub(r'@thermofisher\.com[^a-zA-Z]*', '@thermofisher.com', email)
+def is_below_band(dataframe, band_column, band: int):
+    return (dataframe[band_column] < band) | dataframe[band_column].isna()
 
 
 def normalize_email(dataframe, notification_column):
     dataframe[notification_column] = dataframe[notification_column].str.strip().str.lower()
-    dataframe[notification_column] = dataframe[notification_column].apply(normalize_domain)
+    dataframe[notification_column] = dataframe[notification_column].str.replace(
+        r'@thermofisher\.com[^a-zA-Z]*', '@thermofisher.com', regex=True)
     return dataframe
 
 
-def group_data(dataframe, group_column, ignore_column, notification_column, band_column):
-    filtered_df = filter_nonempty_data(dataframe, f'{group_column}邮箱')
-    grouped_df = filtered_df.groupby(f'{group_column}邮箱', as_index=False).apply(
-        lambda group: group.dropna(subset=['SN号'])).reset_index(drop=True)
-    grouped_df.rename(columns={f'{group_column}邮箱': notification_column, f'{group_column} Band': band_column},
-                      inplace=True)
-    grouped_df['Got from'] = group_column
-    grouped_df.drop(columns=[f'{ignore_column}邮箱', f'{ignore_column} Band'], inplace=True)
-    return grouped_df
+def is_nonempty(series):
+    return series.notna() & (series != '')
 
 
-def filter_nonempty_data(dataframe, column):
-    return dataframe[dataframe[column].notna() & (dataframe[column] != '')].reset_index(drop=True)
+def assign_notification(dataframe, key_column, notification_column, band_column):
+    has_owner = is_nonempty(dataframe['Owner邮箱'])
+    has_user = is_nonempty(dataframe['User邮箱']) & ~dataframe[key_column].isin(dataframe.loc[has_owner, key_column])
+    group_df = pd.DataFrame({
+        key_column: dataframe[key_column],
+        notification_column: dataframe['Owner邮箱'].where(has_owner, dataframe['User邮箱']),
+        band_column: dataframe['Owner Band'].where(has_owner, dataframe['User Band']),
+        'Got from': np.where(has_owner, 'Owner', 'User')
+    })[has_owner | has_user]
+    group_df = group_df.sort_values(by=['Got from', notification_column], kind='stable')
+    return group_df.reset_index(drop=True)
 
 
-def parse_report():
-    load_dotenv()
-    report_folder_path = Path('/', *os.getenv('REPORT_FOLDER').split(',')).resolve()
-    excel_file = pd.ExcelFile(Path(report_folder_path, os.getenv('ASSET_REPORT_NAME')))
-    origin_df = pd.read_excel(excel_file, sheet_name=os.getenv('ASSET_REPORT_DATA_SHEET'))
-    key_column = os.getenv('ASSET_REPORT_PRIMARY_KEY')
-    notification_column = os.getenv('ASSET_REPORT_SEND_NOTIFICATION_TO_COLUMN')
-    band_column = 'Band'
-    statistical_column = os.getenv('ASSET_REPORT_STATISTICAL_COLUMN')
+def merge_notification(dataframe, group_df, key_column, notification_column):
+    final_df = dataframe.merge(group_df, on=key_column, how='left')
+    final_df[notification_column] = fillna_series(final_df[notification_column], '')
+    return final_df
+
 
-    selected_columns = os.getenv('ASSET_REPORT_COLUMN').split(',')
-    df = origin_df.loc[:, selected_columns]
-    df = filter_nonempty_data(df, key_column)
-    owner_group_df = group_data(df, 'Owner', 'User', notification_column, band_column)
-    owner_group_sn = owner_group_df[key_column].reset_index(drop=True)
-    owner_group_remainder_df = df[~df[key_column].isin(owner_group_sn)].reset_index(drop=True)
-    user_group_df = group_data(owner_group_remainder_df, 'User', 'Owner', notification_column, band_column)
-    group_df = pd.concat([owner_group_df, user_group_df], ignore_index=True)
-
-    group_df = normalize_email(group_df, notification_column)
-    group_df = filter_band(group_df, notification_column, band_column, int(os.getenv('ASSET_REPORT_IGNORED_BAND')))
-
-    selected_columns = [key_column, notification_column]
-    final_df = origin_df.merge(group_df[selected_columns], on=key_column, how='left')
-    final_df[notification_column] = final_df[notification_column].fillna('')
-    final_df = filter_manufacturer(final_df, os.getenv('ASSET_REPORT_MANUFACTURER_COLUMN'))
-
-    summary_df = final_df.groupby(notification_column)[key_column].size().reset_index()
-    summary_df.rename(columns={key_column: statistical_column}, inplace=True)
+def build_summary(counts, notification_column, statistical_column):
+    summary_df = counts.rename(statistical_column).rename_axis(notification_column).reset_index()
     summary_df = summary_df.sort_values(by=statistical_column, ascending=False)
     total_row = pd.DataFrame(
         {notification_column: ['Total'], statistical_column: [summary_df[statistical_column].sum()]})
-    summary_df = pd.concat([summary_df, total_row], ignore_index=True)
-
+    return pd.concat([summary_df, total_row], ignore_index=True)
+
+
+def build_group_pipeline(key_column, notification_column, band_column):
+    category_columns = get_category_columns('ASSET_REPORT')
+    return Pipeline('asset group', [
+        row_filter('nonempty_key', lambda df: is_nonempty(df[key_column]), inputs=[key_column]),
+        transform('assign_notification', lambda df: assign_notification(df, key_column, notification_column,
+                                                                         band_column),
+                  inputs=[key_column, 'Owner邮箱', 'User邮箱', 'Owner Band', 'User Band'],
+                  outputs=[key_column, notification_column, band_column, 'Got from'], row_wise=False),
+        transform('normalize_email', lambda df: normalize_email(df, notification_column),
+                  inputs=[notification_column], outputs=[notification_column]),
+        transform('categorize', lambda df: to_categorical(df, category_columns), inputs=[notification_column],
+                  outputs=[notification_column]),
+        transform('max_band', lambda df: get_max_band(df, notification_column, band_column),
+                  inputs=[notification_column, band_column], outputs=[band_column], row_wise=False),
+        row_filter('band', lambda df: is_below_band(df, band_column, int(os.getenv('ASSET_REPORT_IGNORED_BAND'))),
+                   inputs=[band_column])
+    ])
+
+
+def build_final_pipeline(group_df, key_column, notification_column):
+    manufacturer_column = os.getenv('ASSET_REPORT_MANUFACTURER_COLUMN')
+    return Pipeline('asset final', [
+        transform('merge_notification', lambda df: merge_notification(df, group_df, key_column, notification_column),
+                  inputs=[key_column], outputs=[notification_column]),
+        row_filter('manufacturer', lambda df: is_target_manufacturer(df, manufacturer_column),
+                   inputs=[manufacturer_column])
+    ])
+
+
+def parse_report_in_chunks(report_path, output_folder_path, chunk_size, use_cache=True):
+    key_column = os.getenv('ASSET_REPORT_PRIMARY_KEY')
+    notification_column = os.getenv('ASSET_REPORT_SEND_NOTIFICATION_TO_COLUMN')
+    data_sheet = os.getenv('ASSET_REPORT_DATA_SHEET')
+    manufacturer_column = os.getenv('ASSET_REPORT_MANUFACTURER_COLUMN')
+
+    group_pipeline = build_group_pipeline(key_column, notification_column, 'Band')
+    group_columns = [key_column, notification_column]
+    _, source_columns = group_pipeline.plan(group_columns)
+    df = ReportCache().get(report_path, 'asset_columns', read_excel_report, use_cache=use_cache,
+                           columns=sorted(source_columns), sheet_name=data_sheet)
+    group_df = group_pipeline.run(df, group_columns)
+    group_df[key_column] = group_df[key_column].astype(object)
+    del df
+
+    final_pipeline = build_final_pipeline(group_df, key_column, notification_column)
+    counts = pd.Series(dtype='int64')
+    with open_handoff_writer(get_handoff_path(output_folder_path, 'asset'), report_path) as handoff_writer:
+        def iter_final_chunks():
+            nonlocal counts
+            for chunk in iter_excel_report_chunks(report_path, chunk_size, sheet_name=data_sheet):
+                chunk[key_column] = chunk[key_column].astype(object)
+                chunk[manufacturer_column] = chunk[manufacturer_column].astype(object)
+                final_chunk = final_pipeline.run(chunk)
+                counts = counts.add(final_chunk.groupby(notification_column, observed=True)[key_column].size(),
+                                    fill_value=0)
+                handoff_writer.write(final_chunk)
+                yield final_chunk
+
+        if is_excel_output_enabled('asset'):
+            with open_excel_writer(Path(output_folder_path, os.getenv('ASSET_REPORT_OUTPUT'))) as writer:
+                export_dataframes_to_excel(writer, iter_final_chunks(), data_sheet)
+                summary_df = build_summary(counts.sort_index().astype('int64'), notification_column,
+                                           os.getenv('ASSET_REPORT_STATISTICAL_COLUMN'))
+                export_dataframe_to_excel(writer, summary_df, os.getenv('ASSET_REPORT_SUMMARY_SHEET'))
+        else:
+            for _ in iter_final_chunks():
+                pass
+    group_pipeline.log_timings()
+    final_pipeline.log_timings()
+    export_metrics('parse_asset_report')
+
+
+def parse_report(use_cache=True):
+    load_dotenv()
+    report_folder_path = Path('/', *os.getenv('REPORT_FOLDER').split(',')).resolve()
+    report_path = Path(report_folder_path, os.getenv('ASSET_REPORT_NAME'))
     output_folder_path = Path('/', *os.getenv('OUTPUT_FOLDER').split(',')).resolve()
     if not os.path.exists(output_folder_path):
         os.makedirs(output_folder_path)
-    with pd.ExcelWriter(Path(output_folder_path, os.getenv('ASSET_REPORT_OUTPUT')), engine='xlsxwriter') as writer:
-        export_dataframe_to_excel(writer, final_df, os.getenv('ASSET_REPORT_DATA_SHEET'))
-        export_dataframe_to_excel(writer, summary_df, os.getenv('ASSET_REPORT_SUMMARY_SHEET'))
+    chunk_size = int(os.getenv('ASSET_REPORT_CHUNK_SIZE', '0'))
+    if chunk_size:
+        parse_report_in_chunks(report_path, output_folder_path, chunk_size, use_cache)
+        return
+
+    origin_df = ReportCache().get(report_path, 'asset', read_excel_report, use_cache=use_cache,
+                                  sheet_name=os.getenv('ASSET_REPORT_DATA_SHEET'))
+    origin_df = to_categorical(origin_df, get_category_columns('ASSET_REPORT'))
+    key_column = os.getenv('ASSET_REPORT_PRIMARY_KEY')
+    notification_column = os.getenv('ASSET_REPORT_SEND_NOTIFICATION_TO_COLUMN')
+    statistical_column = os.getenv('ASSET_REPORT_STATISTICAL_COLUMN')
+
+    group_pipeline = build_group_pipeline(key_column, notification_column, 'Band')
+    group_df = group_pipeline.run(origin_df, [key_column, notification_column])
+    final_pipeline = build_final_pipeline(group_df, key_column, notification_column)
+    final_df = final_pipeline.run(origin_df)
+
+    summary_df = build_summary(final_df.groupby(notification_column, observed=True)[key_column].size(),
+                               notification_column, statistical_column)
+
+    write_handoff(final_df, get_handoff_path(output_folder_path, 'asset'), report_path)
+    if is_excel_output_enabled('asset'):
+        with open_excel_writer(Path(output_folder_path, os.getenv('ASSET_REPORT_OUTPUT'))) as writer:
+            export_dataframe_to_excel(writer, final_df, os.getenv('ASSET_REPORT_DATA_SHEET'))
+            export_dataframe_to_excel(writer, summary_df, os.getenv('ASSET_REPORT_SUMMARY_SHEET'))
+    group_pipeline.log_timings()
+    final_pipeline.log_timings()
+    export_metrics('parse_asset_report')
 
 
 if __name__ == '__main__':
-    parse_report()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--no-cache', action='store_true', help='parse the report again instead of using the cache')
+    args = parser.parse_args()
+    parse_report(use_cache=not args.no_cache)
@@ -1,47 +1,27 @@
+import argparse
 import datetime
 import errno
 import os
 from pathlib import Path
 
 import pandas as pd
-import wcwidth
 from dotenv import load_dotenv
 
+from utils.excel_reader import read_excel_report
+from utils.excel_writer import export_dataframe_to_excel, open_excel_writer
+from utils.metrics import export_metrics
+from utils.pipeline import Pipeline, row_filter, transform
+from utils.report_cache import ReportCache
+from utils.report_handoff import get_handoff_path, is_excel_output_enabled, write_handoff
 
-def export_dataframe_to_excel(writer, dataframe, sheet_name):
-    workbook = writer.book
-    if sheet_name in workbook.sheetnames:
-        sheet = workbook[sheet_name].clear()
-    else:
-        sheet = workbook.add_worksheet(sheet_name)
-    header_format = workbook.add_format({
-        'bold': True,
-        'bg_color': '#5B9BD5',
-        'font_color': '#FFFFFF'
-    })
-    fmt_time = workbook.add_format({'num_format': 'yyyy-mm-dd'})
-    row = 1
-    for i, row_data in dataframe.iterrows():
-        for col_idx, col_value in enumerate(row_data):
-            if pd.isna(col_value):
-                sheet.write(row, col_idx, None)
-            elif isinstance(col_value, pd.Timestamp):
-                sheet.write_datetime(row, col_idx, col_value.to_pydatetime(), fmt_time)
-            else:
-                sheet.write(row, col_idx, col_value)
-        row += 1
-    worksheet = writer.sheets[sheet_name]
-    if not isinstance(dataframe.columns, pd.RangeIndex):
-        columns_width = [max(len(str(col)), wcwidth.wcswidth(col)) + 4 for col in dataframe.columns]
-        for col_idx, col_name in enumerate(dataframe.columns):
-            worksheet.set_column(col_idx, col_idx, columns_width[col_idx])
-            worksheet.write(0, col_idx, col_name, header_format)
-
-
-def filter_resignation_date(dataframe, date_column, target_month, target_year=datetime.datetime.now().year):
+
+def parse_date(dataframe, date_column):
     dataframe[date_column] = pd.to_datetime(dataframe[date_column])
-    return dataframe[
-        (dataframe[date_column].dt.year == target_year) & (dataframe[date_column].dt.month == target_month)]
+    return dataframe
+
+
+def is_in_month(dataframe, date_column, target_month, target_year=datetime.datetime.now().year):
+    return (dataframe[date_column].dt.year == target_year) & (dataframe[date_column].dt.month == target_month)
 
 
 def get_return_date(dataframe):
@@ -49,8 +29,8 @@ def get_return_date(dataframe):
     return dataframe
 
 
-def filter_return_state(dataframe, target_state):
-    return dataframe[dataframe['归还情况'].str.contains(target_state)]
+def is_return_state(dataframe, target_state):
+    return dataframe['归还情况'].str.contains(target_state)
 
 
 def get_file_path_by_filename(paths, target_filename):
@@ -71,25 +51,41 @@ def get_excel_file():
         return excel_files[0]
 
 
-def parse_report():
+def build_return_pipeline():
+    return Pipeline('return', [
+        row_filter('return_state', lambda df: is_return_state(df, os.getenv('RETURN_REPORT_STATE')),
+                   inputs=['归还情况']),
+        transform('return_date', get_return_date, inputs=['交接日期', '离职日期'], outputs=['待归还日期']),
+        transform('parse_date', lambda df: parse_date(df, '待归还日期'), inputs=['待归还日期'],
+                  outputs=['待归还日期']),
+        row_filter('resignation_month',
+                   lambda df: is_in_month(df, '待归还日期', target_month=int(os.getenv('RETURN_REPORT_MONTH'))),
+                   inputs=['待归还日期'])
+    ])
+
+
+def parse_report(use_cache=True):
     load_dotenv()
     excel_file = get_excel_file()
-    origin_df = pd.read_excel(excel_file, dtype={'员工号': str, '资产号': str, '序列号': str})
-
     selected_columns = os.getenv('RETURN_REPORT_COLUMN').split(',')
-    df = origin_df.loc[:, selected_columns]
-    df = filter_return_state(df, os.getenv('RETURN_REPORT_STATE'))
-    df = get_return_date(df)
-    df = filter_resignation_date(df, '待归还日期', target_month=int(os.getenv('RETURN_REPORT_MONTH')))
+    df = ReportCache().get(excel_file, 'return', read_excel_report, use_cache=use_cache, columns=selected_columns,
+                           dtype={'员工号': str, '资产号': str, '序列号': str}, sheet_name=0)
+    return_pipeline = build_return_pipeline()
+    df = return_pipeline.run(df)
 
     output_folder_path = Path('/', *os.getenv('OUTPUT_FOLDER').split(',')).resolve()
     if not os.path.exists(output_folder_path):
         os.makedirs(output_folder_path)
-    with pd.ExcelWriter(Path(output_folder_path, os.getenv('RETURN_REPORT_OUTPUT')), engine='xlsxwriter') as writer:
-        export_dataframe_to_excel(writer, df, os.getenv('RETURN_REPORT_OUTPUT_SHEET'))
-        export_dataframe_to_excel(writer, pd.DataFrame([[excel_file.__str__()]], columns=None),
-                                  os.getenv('RETURN_REPORT_PATH_SHEET'))
+    write_handoff(df, get_handoff_path(output_folder_path, 'return'), excel_file)
+    if is_excel_output_enabled('return'):
+        with open_excel_writer(Path(output_folder_path, os.getenv('RETURN_REPORT_OUTPUT'))) as writer:
+            export_dataframe_to_excel(writer, df, os.getenv('RETURN_REPORT_OUTPUT_SHEET'))
+    return_pipeline.log_timings()
+    export_metrics('parse_return_report')
 
 
 if __name__ == '__main__':
-    parse_report()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--no-cache', action='store_true', help='parse the report again instead of using the cache')
+    args = parser.parse_args()
+    parse_report(use_cache=not args.no_cache)
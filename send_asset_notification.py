@@ -1,36 +1,65 @@
+import argparse
+import datetime
 import os
+from functools import partial
 from pathlib import Path
 
-import pandas as pd
 from dotenv import load_dotenv
 
+from emails.dispatcher import NotificationDispatcher
 from emails.emails import Emails
+from utils.campaign_state import CampaignState, fingerprint, is_delta_mode_enabled, update_state
+from utils.logger import Logger
+from utils.metrics import export_metrics, span
+from utils.report_handoff import get_handoff_path, read_handoff
+from utils.schema import fill_missing
 
 
 def filter_nonempty_data(dataframe, column):
     return dataframe[dataframe[column].notna() & (dataframe[column] != '')].reset_index(drop=True)
 
 
-def send_notification():
+def send_asset_email(emails, email, info):
+    info = info.reset_index(drop=True)
+    emails.send_asset_email(email, info.to_html(index=False))
+
+
+def send_notification(delta=None):
     load_dotenv()
+    if delta is None:
+        delta = is_delta_mode_enabled()
     output_folder_path = Path('/', *os.getenv('OUTPUT_FOLDER').split(',')).resolve()
-    excel_file = pd.ExcelFile(Path(output_folder_path, os.getenv('ASSET_REPORT_OUTPUT')))
-    df = pd.read_excel(excel_file, sheet_name=os.getenv('ASSET_REPORT_DATA_SHEET'))
+    df, _ = read_handoff(get_handoff_path(output_folder_path, 'asset'))
     key_column = os.getenv('ASSET_REPORT_PRIMARY_KEY')
     model_column = os.getenv('ASSET_REPORT_MODEL_COLUMN')
     notification_column = os.getenv('ASSET_REPORT_SEND_NOTIFICATION_TO_COLUMN')
 
-    df.replace({None: '', pd.NA: '', float('nan'): ''}, inplace=True)
-    df = filter_nonempty_data(df, notification_column)
+    with span('clean'):
+        df = fill_missing(df)
+        df = filter_nonempty_data(df, notification_column)
 
-    grouped_df = df.groupby(notification_column).apply(lambda group: group.loc[:, [key_column, model_column]])
+    grouped_df = df.groupby(notification_column, observed=True).apply(
+        lambda group: group.loc[:, [key_column, model_column]])
     grouped_df.rename(columns={key_column: 'IT设备编号', model_column: '型号'}, inplace=True)
     grouped_df['是否在用此设备（是/否）'] = ''
-    for email, info in grouped_df.groupby(level=0):
-        info.reset_index(drop=True, inplace=True)
-        info_html = info.to_html(index=False)
-        Emails('asset').send_asset_email(email, info_html)
+    emails = Emails('asset')
+    groups = [(email, info, fingerprint(info)) for email, info in grouped_df.groupby(level=0, observed=True)]
+    state = CampaignState(f'asset_{datetime.datetime.now().year}')
+    if delta:
+        changed_groups = [group for group in groups if state.is_changed(group[0], group[2])]
+        Logger().info(msg=f'Delta mode skips {len(groups) - len(changed_groups)} unchanged recipients')
+        groups = changed_groups
+    tasks = [partial(send_asset_email, emails, email, info) for email, info, _ in groups]
+    try:
+        NotificationDispatcher().dispatch(tasks, on_result=partial(update_state, state, groups))
+    finally:
+        state.save()
+    export_metrics('send_asset_notification')
 
 
 if __name__ == '__main__':
-    send_notification()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--delta', action='store_true', default=None,
+                        help='only notify recipients whose assets changed or who failed last time')
+    args = parser.parse_args()
+    send_notification(delta=args.delta)
@@ -1,101 +1,58 @@
+import argparse
 import errno
 import os
-from email import encoders
-from email.header import Header
-from email.mime.base import MIMEBase
+from functools import partial
 from pathlib import Path
 
-import openpyxl
 import pandas as pd
-from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 
 from databases.emp_collect_database import EMPCollectDatabase
 from databases.emp_info_database import EMPInfoDatabase
+from emails.dispatcher import NotificationDispatcher
 from emails.emails import Emails
-from utils.email_logger import EmailSendingLogger
+from emails.mime_parts import AttachmentCache
+from utils.campaign_state import CampaignState, fingerprint, is_delta_mode_enabled, update_state
+from utils.email_logger import LOG_COLUMNS, EmailSendingLogger
+from utils.excel_reader import read_excel_report
+from utils.html_table import render_table
+from utils.logger import Logger
+from utils.metrics import export_metrics, render_metrics, span
+from utils.report_cache import ReportCache
+from utils.schema import get_category_columns, to_categorical
+from utils.validation import (ValidationRule, build_issue_report, has_duplicates, has_missing, is_flagged,
+                              is_not_unique, validate_groups)
 
 
 def generate_summary_data(dataframe, name_column, email_column):
-    df = pd.DataFrame(EmailSendingLogger().get_log_data())
+    df = pd.DataFrame(EmailSendingLogger().get_log_data(), columns=LOG_COLUMNS)
     df = df.merge(dataframe, left_on='recipient', right_on=email_column, how='left')
     df['success'] = df['success'].replace({True: 'Y', False: 'N'})
     df = df[['time', name_column, 'recipient', 'subject', 'success', 'error_message']]
-    df.rename(columns={'time': '发送时间', name_column: '员工中文名', 'recipient': '收件邮箱',
-                       'subject': '邮件标题', 'success': '是否发送成功', 'error_message': '详细信息'}, inplace=True)
-    soup = BeautifulSoup(df.to_html(index=False), 'html.parser')
-    rows = soup.find_all('tbody')[0].find_all('tr')
-    for row in rows:
-        success_cell = row.find_all('td')[4]
-        if success_cell.get_text() == 'N':
-            row['class'] = 'failed'
-    return soup.prettify()
+    df.rename(columns={'time': '发送时间', name_column: '员工中文名', 'recipient': '收件邮箱', 'subject': '邮件标题',
+                       'success': '是否发送成功', 'error_message': '详细信息'}, inplace=True)
+    return render_table(df, row_class=lambda row: 'failed' if row[4] == 'N' else None)
 
 
 def attach_excel(excel_file):
-    with open(excel_file, 'rb') as attachment:
-        execl = MIMEBase("application", "octet-stream")
-        execl.set_payload(attachment.read())
-    encoders.encode_base64(execl)
-    execl.add_header('Content-Disposition', 'attachment', filename=Header(excel_file.name, 'utf-8').encode())
-    return execl
-
-
-def generate_issue_data(dataframe, validate_result, key_column):
-    result_dict = {}
-    dataframe[key_column] = dataframe[key_column].str.lower()
-    for entry in validate_result:
-        index = entry['index'].lower()
-        reason = ', '.join(entry['reason'])
-
-        filtered_df = dataframe[dataframe[key_column] == index].copy()
-        if not filtered_df.empty:
-            filtered_df.loc[:, '原因'] = reason
-            result_dict[index] = filtered_df
-    result_df = pd.concat(result_dict.values(), ignore_index=True)
-    result_df.replace({None: '', pd.NA: '', float('nan'): ''}, inplace=True)
-    return result_df
-
-
-def validate_name(index, dataframe, column):
-    has_nan_or_empty = dataframe[column].isna() | (dataframe[column] == '')
-    if has_nan_or_empty.any():
-        return {'index': index, 'reason': '员工名字不存在'}
-    is_uniqueness = dataframe[column].nunique() == 1
-    if not is_uniqueness:
-        return {'index': index, 'reason': '员工名字不唯一'}
-
-
-def validate_sn_uniqueness(index, dataframe, column):
-    is_uniqueness = len(dataframe[column]) == len(dataframe[column].unique())
-    if not is_uniqueness:
-        return {'index': index, 'reason': '设备序列号有重复'}
-
-
-def validate_band(index):
-    emp_info_database = EMPInfoDatabase()
-    emp_collect_database = EMPCollectDatabase()
-    if emp_info_database.is_china_vip(index) or emp_collect_database.is_high_band(index):
-        return {'index': index, 'reason': '员工级别高'}
-
-
-def validate_info(dataframe, name_column, sn_column):
-    validate_result = []
-    for index, info in dataframe.groupby(level=0):
-        validate_result.append(validate_name(index, info, name_column))
-        validate_result.append(validate_sn_uniqueness(index, info, sn_column))
-        validate_result.append(validate_band(index))
-    validate_result = list(filter(lambda item: item is not None, validate_result))
-    result = {}
-    for entry in validate_result:
-        index = entry['index']
-        reason = entry['reason']
-        if index in result:
-            result[index]['reason'].append(reason)
-        else:
-            result[index] = {'index': index, 'reason': [reason]}
-    result_list = list(result.values())
-    return result_list
+    return AttachmentCache().get(excel_file)
+
+
+def get_high_band_emails(emails):
+    emails = list(emails)
+    china_vips = EMPInfoDatabase().china_vips(emails)
+    high_bands = EMPCollectDatabase().high_bands(emails)
+    return {email for email in emails if china_vips[email] or high_bands[email]}
+
+
+def validate_info(dataframe, email_column, name_column, sn_column):
+    rules = [
+        ValidationRule('员工名字不存在', has_missing(name_column)),
+        ValidationRule('员工名字不唯一', is_not_unique(name_column, unless_missing=True)),
+        ValidationRule('设备序列号有重复', has_duplicates(sn_column)),
+        ValidationRule('员工级别高', is_flagged(get_high_band_emails))
+    ]
+    return validate_groups(dataframe, email_column, rules)
 
 
 def clean_sn(dataframe, sn_column):
@@ -124,17 +81,6 @@ def get_columns_as_str(columns, dtype=str):
     return dtype_dict
 
 
-def get_visible_sheet_name(excel_file):
-    sheets = openpyxl.load_workbook(excel_file, read_only=True).worksheets
-    visible_sheets = []
-    for sheet in sheets:
-        if sheet.sheet_state != 'hidden':
-            visible_sheets.append(sheet.title)
-    if len(visible_sheets) != 1:
-        raise Exception('The Excel file should contain only one visible sheet')
-    return visible_sheets[0]
-
-
 def get_excel_file():
     folder_path = Path('/', *os.getenv('REPORT_FOLDER').split(','),
                        *os.getenv('QUARTERLY_ASSET_REPORT_FOLDER').split(',')).resolve()
@@ -146,45 +92,75 @@ def get_excel_file():
         return excel_files[0]
 
 
+def load_report(excel_file, selected_columns, dtype_dict, email_column, name_column, sn_column):
+    df = read_excel_report(excel_file, columns=selected_columns, dtype=dtype_dict)
+    df = df.dropna(how='all')
+
+    with span('clean'):
+        df = clean_email(df, email_column)
+        df = clean_sn(df, sn_column)
+        df = clean_name(df, name_column)
+        return to_categorical(df, get_category_columns('QUARTERLY_ASSET_REPORT'))
+
+
 def generate_name_email_mapping(dataframe, name_column, email_column):
     df = dataframe.loc[:, [name_column, email_column]]
     df = df.drop_duplicates()
     return df
 
 
-def send_notification():
+def send_inventory_email(emails, email, info, name_column):
+    emails.send_inventory_email(info[name_column][0], email,
+                                info.loc[:, ['型号', '序列号/服务编号']].to_html(index=False))
+
+
+def send_notification(use_cache=True, delta=None):
     load_dotenv()
+    if delta is None:
+        delta = is_delta_mode_enabled()
     email_column = os.getenv('QUARTERLY_ASSET_REPORT_EMAIL_COLUMN')
     name_column = os.getenv('QUARTERLY_ASSET_REPORT_NAME_COLUMN')
     model_column = os.getenv('QUARTERLY_ASSET_REPORT_MODEL_COLUMN')
     sn_column = os.getenv('QUARTERLY_ASSET_REPORT_SN_COLUMN')
     excel_file = get_excel_file()
-    visible_sheet_name = get_visible_sheet_name(excel_file)
     dtype_dict = get_columns_as_str(os.getenv('QUARTERLY_ASSET_REPORT_STR_COLUMNS'))
 
-    origin_df = pd.read_excel(excel_file, sheet_name=visible_sheet_name, dtype=dtype_dict)
     selected_columns = os.getenv('QUARTERLY_ASSET_REPORT_COLUMN').split(',')
-    df = origin_df.loc[:, selected_columns]
-    df = df.dropna(how='all')
-
-    df = clean_email(df, email_column)
-    df = clean_sn(df, sn_column)
-    df = clean_name(df, name_column)
-    grouped_df = df.groupby(email_column).apply(lambda group: group.loc[:, [name_column, model_column, sn_column]])
-
-    validate_result = validate_info(grouped_df, name_column, sn_column)
-    if validate_result:
-        issue_data = generate_issue_data(df, validate_result, email_column)
+    df = ReportCache().get(excel_file, 'quarterly', load_report, selected_columns, dtype_dict, email_column,
+                           name_column, sn_column, use_cache=use_cache,
+                           env=('QUARTERLY_ASSET_REPORT_CATEGORY_COLUMNS',))
+    grouped_df = df.groupby(email_column, observed=True).apply(
+        lambda group: group.loc[:, [name_column, model_column, sn_column]])
+
+    validate_result = validate_info(df, email_column, name_column, sn_column)
+    if not validate_result.empty:
+        issue_data = build_issue_report(df, validate_result, email_column)
         Emails('inventory_error').send_inventory_error_email(issue_data.to_html(index=False), attach_excel(excel_file))
     else:
         grouped_df.rename(columns={model_column: '型号', sn_column: '序列号/服务编号'}, inplace=True)
-        for email, info in grouped_df.groupby(level=0):
-            Emails('quarterly_asset').send_inventory_email(info[name_column][0], email,
-                                                           info.loc[:, ['型号', '序列号/服务编号']].to_html(index=False))
+        emails = Emails('quarterly_asset')
+        groups = [(email, info, fingerprint(info)) for email, info in grouped_df.groupby(level=0, observed=True)]
+        state = CampaignState('quarterly_asset_{}{}'.format(*emails.extract_year_quarter()))
+        if delta:
+            changed_groups = [group for group in groups if state.is_changed(group[0], group[2])]
+            Logger().info(msg=f'Delta mode skips {len(groups) - len(changed_groups)} unchanged recipients')
+            groups = changed_groups
+        tasks = [partial(send_inventory_email, emails, email, info, name_column) for email, info, _ in groups]
+        try:
+            NotificationDispatcher().dispatch(tasks, on_result=partial(update_state, state, groups))
+        finally:
+            state.save()
         name_email_mapping = generate_name_email_mapping(df, name_column, email_column)
-        sent_summary_info = generate_summary_data(name_email_mapping, name_column, email_column)
+        sent_summary_info = generate_summary_data(name_email_mapping, name_column, email_column) + \
+            render_metrics('send_quarterly_asset_notification')
         Emails('inventory_summary').send_inventory_summary_email(sent_summary_info, attach_excel(excel_file))
+    export_metrics('send_quarterly_asset_notification')
 
 
 if __name__ == '__main__':
-    send_notification()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--no-cache', action='store_true', help='parse the report again instead of using the cache')
+    parser.add_argument('--delta', action='store_true', default=None,
+                        help='only notify recipients whose assets changed or who failed last time')
+    args = parser.parse_args()
+    send_notification(use_cache=not args.no_cache, delta=args.delta)
@@ -0,0 +1,46 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+
+def is_delta_mode_enabled():
+    return os.getenv('CAMPAIGN_DELTA_MODE', 'false').lower() == 'true'
+
+
+def fingerprint(dataframe):
+    rows = sorted(map(list, dataframe.astype(str).itertuples(index=False, name=None)))
+    return hashlib.sha256(json.dumps(rows, ensure_ascii=False).encode()).hexdigest()
+
+
+def is_sent(log_entries):
+    return bool(log_entries) and all(entry['success'] for entry in log_entries)
+
+
+def update_state(state, groups, index, log_entries):
+    recipient, _, recipient_fingerprint = groups[index]
+    state.update(recipient, recipient_fingerprint, is_sent(log_entries))
+
+
+class CampaignState(object):
+    def __init__(self, campaign):
+        folder = Path('/', *os.getenv('CAMPAIGN_STATE_FOLDER').split(',')).resolve()
+        folder.mkdir(parents=True, exist_ok=True)
+        self.path = Path(folder, f'{campaign}.json')
+        self.recipients = {}
+        if self.path.exists():
+            with open(self.path, 'r', encoding='UTF-8') as file:
+                self.recipients = json.load(file)
+
+    def is_changed(self, recipient, recipient_fingerprint):
+        previous = self.recipients.get(recipient)
+        return previous is None or not previous['success'] or previous['fingerprint'] != recipient_fingerprint
+
+    def update(self, recipient, recipient_fingerprint, success):
+        self.recipients[recipient] = {'fingerprint': recipient_fingerprint, 'success': success}
+
+    def save(self):
+        temp_path = self.path.with_name(f'.{self.path.name}.tmp')
+        with open(temp_path, 'w', encoding='UTF-8') as file:
+            json.dump(self.recipients, file, ensure_ascii=False)
+        os.replace(temp_path, self.path)
@@ -1,24 +1,146 @@
+import atexit
 import datetime
+import os
+import queue
+import sqlite3
+import threading
+import uuid
+from contextlib import closing, contextmanager
+from pathlib import Path
+
+from utils.logger import Logger
+
+LOG_COLUMNS = ['time', 'recipient', 'subject', 'success', 'error_code', 'error_message']
 
 
 class EmailSendingLogger:
     _instance = None
+    _instance_lock = threading.Lock()
+    _local = threading.local()
 
     def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-            cls._instance.log_data = []
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+                cls._instance._setup()
         return cls._instance
 
+    def _setup(self):
+        folder = Path('/', *os.getenv('EMAIL_JOURNAL_FOLDER').split(',')).resolve()
+        folder.mkdir(parents=True, exist_ok=True)
+        self.path = Path(folder, os.getenv('EMAIL_JOURNAL_FILE', 'send_journal.sqlite'))
+        self.batch_size = int(os.getenv('EMAIL_JOURNAL_BATCH_SIZE', '500'))
+        self.run_id = uuid.uuid4().hex
+        self.queue = queue.Queue()
+        with closing(self._connect()) as connection, connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS email_log (id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                               'run_id TEXT NOT NULL, time TEXT NOT NULL, recipient TEXT, subject TEXT, '
+                               'success INTEGER NOT NULL, error_code INTEGER, error_message TEXT)')
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_email_log_run ON email_log (run_id, success, error_code)')
+            retention_days = int(os.getenv('EMAIL_JOURNAL_RETENTION_DAYS', '0'))
+            if retention_days:
+                cutoff = datetime.datetime.utcnow() + datetime.timedelta(hours=8) - datetime.timedelta(
+                    days=retention_days)
+                connection.execute('DELETE FROM email_log WHERE time < ?', (cutoff.isoformat(),))
+        self.writer = threading.Thread(target=self._write, name='email-journal-writer', daemon=True)
+        self.writer.start()
+        atexit.register(self.close)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _write(self):
+        with closing(self._connect()) as connection:
+            connection.execute('PRAGMA synchronous=NORMAL')
+            while True:
+                items = [self.queue.get()]
+                while len(items) < self.batch_size:
+                    try:
+                        items.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                rows = [item for item in items if item is not None]
+                try:
+                    with connection:
+                        connection.executemany('INSERT INTO email_log (run_id, time, recipient, subject, success, '
+                                               'error_code, error_message) VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+                except Exception as e:
+                    Logger().error(msg=f'Failed to write {len(rows)} email log entries to {self.path}: {e}')
+                finally:
+                    for _ in items:
+                        self.queue.task_done()
+                if len(rows) < len(items):
+                    return
+
+    def _enqueue(self, log_entry):
+        self.queue.put((self.run_id, log_entry['time'].isoformat(), log_entry['recipient'], log_entry['subject'],
+                        int(bool(log_entry['success'])), log_entry.get('error_code'), log_entry['error_message']))
+
     def log_email_sent(self, recipient, subject, success, error_code=None, error_message=None):
         log_entry = {
             'time': datetime.datetime.utcnow() + datetime.timedelta(hours=8),
             'recipient': recipient,
             'subject': subject,
             'success': success,
+            'error_code': error_code if not success else None,
             'error_message': f'error code {error_code}, {error_message}' if not success else ''
         }
-        self.log_data.append(log_entry)
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is not None:
+            buffer.append(log_entry)
+        else:
+            self._enqueue(log_entry)
+
+    @contextmanager
+    def collect(self):
+        self._local.buffer = []
+        try:
+            yield self._local.buffer
+        finally:
+            self._local.buffer = None
+
+    def extend(self, log_entries):
+        for log_entry in log_entries:
+            self._enqueue(log_entry)
+
+    def flush(self):
+        if not self.writer.is_alive():
+            Logger().error(msg=f'Email journal writer for {self.path} is not running, skipping flush')
+            return
+        self.queue.join()
+
+    def start_run(self):
+        self.flush()
+        self.run_id = uuid.uuid4().hex
+        return self.run_id
+
+    def _query(self, sql):
+        self.flush()
+        with closing(self._connect()) as connection:
+            return connection.execute(sql, (self.run_id,)).fetchall()
 
     def get_log_data(self):
-        return self.log_data
+        rows = self._query('SELECT time, recipient, subject, success, error_code, error_message FROM email_log '
+                           'WHERE run_id = ? ORDER BY id')
+        return [{
+            'time': datetime.datetime.fromisoformat(time),
+            'recipient': recipient,
+            'subject': subject,
+            'success': bool(success),
+            'error_code': error_code,
+            'error_message': error_message
+        } for time, recipient, subject, success, error_code, error_message in rows]
+
+    def count_results(self):
+        counts = dict(self._query('SELECT success, COUNT(*) FROM email_log WHERE run_id = ? GROUP BY success'))
+        return {'success': counts.get(1, 0), 'failed': counts.get(0, 0)}
+
+    def count_failures_by_code(self):
+        return dict(self._query('SELECT error_code, COUNT(*) FROM email_log WHERE run_id = ? AND success = 0 '
+                                'GROUP BY error_code ORDER BY COUNT(*) DESC'))
+
+    def close(self):
+        if self.writer.is_alive():
+            self.queue.put(None)
+            self.writer.join()
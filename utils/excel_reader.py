@@ -0,0 +1,145 @@
+import itertools
+from pathlib import Path
+
+import openpyxl
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+from utils.metrics import timed
+
+
+def get_visible_sheet(workbook):
+    visible_sheets = [sheet for sheet in workbook.worksheets if sheet.sheet_state != 'hidden']
+    if len(visible_sheets) != 1:
+        raise Exception('The Excel file should contain only one visible sheet')
+    return visible_sheets[0]
+
+
+def get_sheet(workbook, sheet_name=None):
+    if sheet_name is None:
+        return get_visible_sheet(workbook)
+    if isinstance(sheet_name, int):
+        return workbook.worksheets[sheet_name]
+    return workbook[sheet_name]
+
+
+def convert_cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        int_value = int(value)
+        return int_value if int_value == value else value
+    return value
+
+
+def get_column_indices(header, columns):
+    header = list(header)
+    indices = []
+    for column in columns:
+        if column not in header:
+            raise KeyError(f'Column {column} not found in the Excel file')
+        indices.append(header.index(column))
+    return indices
+
+
+def iter_sheet_rows(sheet, columns=None):
+    rows = sheet.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return
+    if columns is None:
+        yield header
+        yield from rows
+        return
+    indices = get_column_indices(header, columns)
+    for row in itertools.chain([header], rows):
+        yield [row[index] if index < len(row) else None for index in indices]
+
+
+def convert_row(row):
+    converted_row = [convert_cell(value) for value in row]
+    while converted_row and converted_row[-1] == '':
+        converted_row.pop()
+    return converted_row
+
+
+def read_sheet_data(sheet, columns=None):
+    data = []
+    last_row_with_data = -1
+    for row_number, row in enumerate(iter_sheet_rows(sheet, columns)):
+        converted_row = convert_row(row)
+        if converted_row:
+            last_row_with_data = row_number
+        data.append(converted_row)
+    data = data[:last_row_with_data + 1]
+    if data:
+        max_width = max(len(row) for row in data)
+        data = [row + [''] * (max_width - len(row)) for row in data]
+    return data
+
+
+def parse_rows(header, rows, dtype=None, start=0):
+    dataframe = TextParser([header] + rows, header=0, dtype=dtype, skip_blank_lines=False).read()
+    dataframe.index = pd.RangeIndex(start, start + len(dataframe))
+    return dataframe
+
+
+def read_xls_report(excel_file, columns=None, dtype=None, sheet_name=None):
+    dataframe = pd.read_excel(excel_file, sheet_name=0 if sheet_name is None else sheet_name, dtype=dtype,
+                              usecols=columns)
+    return dataframe if columns is None else dataframe.loc[:, columns]
+
+
+def open_workbook(excel_file):
+    return openpyxl.load_workbook(excel_file, read_only=True, data_only=True, keep_links=False)
+
+
+def iter_excel_report_chunks(excel_file, chunk_size, columns=None, dtype=None, sheet_name=None):
+    excel_file = Path(excel_file)
+    if excel_file.suffix.lower() == '.xls':
+        raise ValueError(f'{excel_file.name} is an .xls workbook, which cannot be read in chunks')
+    workbook = open_workbook(excel_file)
+    try:
+        sheet = get_sheet(workbook, sheet_name)
+        sheet.reset_dimensions()
+        rows = iter_sheet_rows(sheet, columns)
+        header = convert_row(next(rows, ()))
+        if not header:
+            return
+        width = len(header)
+        start = 0
+        buffer = []
+        blank_rows = []
+        for row in rows:
+            converted_row = convert_row(row)[:width]
+            if not converted_row:
+                blank_rows.append([''] * width)
+                continue
+            buffer.extend(blank_rows)
+            blank_rows = []
+            buffer.append(converted_row + [''] * (width - len(converted_row)))
+            if len(buffer) >= chunk_size:
+                yield parse_rows(header, buffer, dtype, start)
+                start += len(buffer)
+                buffer = []
+        if buffer:
+            yield parse_rows(header, buffer, dtype, start)
+    finally:
+        workbook.close()
+
+
+@timed('ingest.excel')
+def read_excel_report(excel_file, columns=None, dtype=None, sheet_name=None):
+    excel_file = Path(excel_file)
+    if excel_file.suffix.lower() == '.xls':
+        return read_xls_report(excel_file, columns, dtype, sheet_name)
+    workbook = open_workbook(excel_file)
+    try:
+        sheet = get_sheet(workbook, sheet_name)
+        sheet.reset_dimensions()
+        data = read_sheet_data(sheet, columns)
+    finally:
+        workbook.close()
+    if not data:
+        return pd.DataFrame(columns=columns)
+    return TextParser(data, header=0, dtype=dtype, skip_blank_lines=False).read()
@@ -0,0 +1,97 @@
+import pandas as pd
+import wcwidth
+
+from utils.schema import to_dense
+
+HEADER_FORMAT = {
+    'bold': True,
+    'bg_color': '#5B9BD5',
+    'font_color': '#FFFFFF'
+}
+DATE_FORMAT = {'num_format': 'yyyy-mm-dd'}
+DATE_WIDTH = 10
+MAX_COLUMN_WIDTH = 60
+
+
+def open_excel_writer(path):
+    return pd.ExcelWriter(path, engine='xlsxwriter', engine_kwargs={'options': {'constant_memory': True}})
+
+
+def text_width(text):
+    if text.isascii():
+        return len(text)
+    return max(len(text), wcwidth.wcswidth(text))
+
+
+def _prepare_column(sheet, series, date_format):
+    series = to_dense(series)
+    missing = series.isna().to_numpy()
+    if pd.api.types.is_datetime64_any_dtype(series) or \
+            pd.api.types.infer_dtype(series, skipna=True) in ('datetime', 'datetime64', 'date'):
+        values = pd.to_datetime(series).dt.to_pydatetime()
+        return _mask(values, missing), lambda row, col, value: sheet.write_datetime(row, col, value, date_format), \
+            DATE_WIDTH
+    if pd.api.types.is_bool_dtype(series):
+        values = series.tolist()
+        return _mask(values, missing), sheet.write_boolean, 5
+    if pd.api.types.is_numeric_dtype(series):
+        values = series.tolist()
+        width = series.dropna().astype(str).str.len().max()
+        return _mask(values, missing), sheet.write_number, 0 if pd.isna(width) else width
+    if pd.api.types.infer_dtype(series, skipna=True) == 'string':
+        missing |= (series == '').to_numpy()
+        values = series.tolist()
+        widths = [text_width(value) for value in series[~missing].unique()]
+        return _mask(values, missing), sheet.write_string, max(widths, default=0)
+
+    def write_mixed(row, col, value):
+        if isinstance(value, pd.Timestamp):
+            sheet.write_datetime(row, col, value.to_pydatetime(), date_format)
+        else:
+            sheet.write(row, col, value)
+
+    values = series.tolist()
+    widths = [DATE_WIDTH if isinstance(value, pd.Timestamp) else text_width(str(value)) for value in
+              series[~missing].unique()]
+    return _mask(values, missing), write_mixed, max(widths, default=0)
+
+
+def _mask(values, missing):
+    if missing.any():
+        return [None if is_missing else value for value, is_missing in zip(values, missing)]
+    return list(values)
+
+
+def export_dataframe_to_excel(writer, dataframe, sheet_name):
+    export_dataframes_to_excel(writer, [dataframe], sheet_name)
+
+
+def export_dataframes_to_excel(writer, dataframes, sheet_name):
+    workbook = writer.book
+    sheet = workbook.get_worksheet_by_name(sheet_name) or workbook.add_worksheet(sheet_name)
+    date_format = workbook.add_format(DATE_FORMAT)
+    header = None
+    widths = []
+    row_idx = 1
+    for dataframe in dataframes:
+        if header is None:
+            header = dataframe.columns
+            widths = [0] * len(header)
+            if not isinstance(header, pd.RangeIndex):
+                header_format = workbook.add_format(HEADER_FORMAT)
+                for col_idx, col_name in enumerate(header):
+                    sheet.write(0, col_idx, col_name, header_format)
+        columns = [_prepare_column(sheet, dataframe.iloc[:, col_idx], date_format) for col_idx in
+                   range(len(dataframe.columns))]
+        widths = [max(width, column_width) for width, (_, _, column_width) in zip(widths, columns)]
+        column_writers = [(col_idx, write) for col_idx, (_, write, _) in enumerate(columns)]
+        for row_values in zip(*[values for values, _, _ in columns]):
+            for col_idx, write in column_writers:
+                value = row_values[col_idx]
+                if value is not None:
+                    write(row_idx, col_idx, value)
+            row_idx += 1
+    if header is not None and not isinstance(header, pd.RangeIndex):
+        for col_idx, col_name in enumerate(header):
+            width = max(text_width(str(col_name)), widths[col_idx])
+            sheet.set_column(col_idx, col_idx, min(width, MAX_COLUMN_WIDTH) + 4)
@@ -0,0 +1,25 @@
+import datetime
+from html import escape
+
+import pandas as pd
+
+
+def format_cell(value):
+    if value is None or value is pd.NaT or (isinstance(value, float) and value != value):
+        return ''
+    if isinstance(value, datetime.datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return escape(str(value))
+
+
+def render_table(dataframe, row_class=None):
+    parts = ['<table border="1" class="dataframe">\n  <thead>\n    <tr style="text-align: right;">\n']
+    parts.extend(f'      <th>{format_cell(column)}</th>\n' for column in dataframe.columns)
+    parts.append('    </tr>\n  </thead>\n  <tbody>\n')
+    for row in dataframe.itertuples(index=False, name=None):
+        css_class = row_class(row) if row_class else None
+        parts.append(f'    <tr class="{css_class}">\n' if css_class else '    <tr>\n')
+        parts.extend(f'      <td>{format_cell(value)}</td>\n' for value in row)
+        parts.append('    </tr>\n')
+    parts.append('  </tbody>\n</table>')
+    return ''.join(parts)
@@ -1,44 +1,75 @@
-import inspect
+import atexit
+import functools
 import json
 import logging
 import logging.config
+import logging.handlers
 import os
+import queue
+import sys
+import threading
 import time
 from pathlib import Path
 
+_config_lock = threading.Lock()
+_configured = False
 
-class Logger(object):
-    def __init__(self, default_path=os.path.join(os.path.dirname(__file__), 'logging_config.json'),
-                 default_level=logging.DEBUG):
-        self.path = default_path
-        self.level = default_level
-        self.caller_name = None
-        self.detect_caller_info()
-        with open(self.path, 'r', encoding='UTF-8') as file:
+
+def configure_logging(config_path=os.path.join(os.path.dirname(__file__), 'logging_config.json')):
+    global _configured
+    if _configured:
+        return
+    with _config_lock:
+        if _configured:
+            return
+        with open(config_path, 'r', encoding='UTF-8') as file:
             logging_config = json.load(file)
         log_folder = Path('/', *os.getenv('LOG_FOLDER').split(',')).resolve().absolute()
         log_folder.mkdir(parents=True, exist_ok=True)
         log_file = Path(log_folder, os.getenv('LOG_FILE'))
         logging_config["handlers"]["info_file"]["filename"] = log_file
-        self.logger = self.get_logger(f'{self.caller_name}', logging_config)
-        return
-
-    def get_logger(self, name, logging_config):
         logging.config.dictConfig(logging_config)
         logging.Formatter.converter = time.localtime
-        logger = logging.getLogger(name)
-        logger.setLevel(self.level)
-        return logger
+        if os.getenv('LOG_QUEUE', 'false').lower() == 'true':
+            root_logger = logging.getLogger()
+            log_queue = queue.SimpleQueue()
+            listener = logging.handlers.QueueListener(log_queue, *root_logger.handlers, respect_handler_level=True)
+            root_logger.handlers = [logging.handlers.QueueHandler(log_queue)]
+            listener.start()
+            atexit.register(listener.stop)
+        _configured = True
+
+
+@functools.lru_cache(maxsize=None)
+def get_logger(name, level=logging.DEBUG):
+    configure_logging()
+    logger = logging.getLogger(name)
+    logger.setLevel(level)
+    return logger
+
+
+class Logger(object):
+    def __init__(self, default_path=os.path.join(os.path.dirname(__file__), 'logging_config.json'),
+                 default_level=logging.DEBUG):
+        self.path = default_path
+        self.level = default_level
+        self.caller_name = None
+        self.detect_caller_info()
+        configure_logging(self.path)
+        self.logger = get_logger(f'{self.caller_name}', self.level)
 
     def detect_caller_info(self):
-        stack = inspect.stack()
         try:
-            caller_frame = stack[2]
-            caller_class = caller_frame.frame.f_locals['self'].__class__.__name__
-            caller_method = caller_frame.frame.f_code.co_name
-            self.caller_name = f'{caller_class}.{caller_method}'
-        except (AttributeError, IndexError):
+            caller_frame = sys._getframe(2)
+        except ValueError:
             self.caller_name = None
+            return
+        caller = caller_frame.f_locals.get('self')
+        caller_method = caller_frame.f_code.co_name
+        if caller is not None:
+            self.caller_name = f'{caller.__class__.__name__}.{caller_method}'
+        else:
+            self.caller_name = f"{caller_frame.f_globals.get('__name__')}.{caller_method}"
 
     def debug(self, msg, *args, **kwargs):
         self.logger.debug(msg, *args, **kwargs)
@@ -0,0 +1,171 @@
+import datetime
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+import pandas as pd
+
+from utils.html_table import render_table
+from utils.logger import Logger
+
+PREFIX = 'asset_management'
+COUNTER_HELP = {
+    'messages_sent': 'Messages accepted by the SMTP server for every recipient.',
+    'messages_failed': 'Messages refused by the SMTP server for at least one recipient.',
+    'bytes_sent': 'Size of the messages handed to the SMTP server.',
+    'db_round_trips': 'Queries sent to the employee databases.'
+}
+_null_span = nullcontext()
+
+
+def is_metrics_enabled():
+    return os.getenv('METRICS_ENABLED', 'false').lower() == 'true'
+
+
+class Metrics(object):
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+                cls._instance.enabled = is_metrics_enabled()
+                cls._instance.lock = threading.Lock()
+                cls._instance.reset()
+        return cls._instance
+
+    def reset(self):
+        with self.lock:
+            self.started_at = datetime.datetime.now()
+            self.spans = {}
+            self.counters = {}
+
+    def observe(self, name, seconds):
+        with self.lock:
+            calls, total, longest = self.spans.get(name, (0, 0.0, 0.0))
+            self.spans[name] = (calls + 1, total + seconds, max(longest, seconds))
+
+    def increment(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self, job):
+        with self.lock:
+            return {
+                'job': job,
+                'started_at': self.started_at.isoformat(timespec='seconds'),
+                'finished_at': datetime.datetime.now().isoformat(timespec='seconds'),
+                'spans': {name: {'calls': calls, 'seconds': round(total, 6), 'max_seconds': round(longest, 6)} for
+                          name, (calls, total, longest) in sorted(self.spans.items())},
+                'counters': dict(sorted(self.counters.items()))
+            }
+
+
+def get_metrics():
+    return Metrics._instance or Metrics()
+
+
+def span(name):
+    metrics = get_metrics()
+    if not metrics.enabled:
+        return _null_span
+    return metrics.span(name)
+
+
+def observe(name, seconds):
+    metrics = get_metrics()
+    if metrics.enabled:
+        metrics.observe(name, seconds)
+
+
+def increment(name, value=1):
+    metrics = get_metrics()
+    if metrics.enabled:
+        metrics.increment(name, value)
+
+
+def timed(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_gauge(name, help_text, samples):
+    lines = [f'# HELP {PREFIX}_{name} {help_text}', f'# TYPE {PREFIX}_{name} gauge']
+    for labels, value in samples:
+        label_text = ','.join(f'{key}="{_escape_label(label)}"' for key, label in labels.items())
+        lines.append(f'{PREFIX}_{name}{{{label_text}}} {value}')
+    return lines
+
+
+def to_prometheus(report):
+    job = report['job']
+    spans = report['spans'].items()
+    lines = _format_gauge('span_seconds', 'Time spent in each instrumented stage during the last run.',
+                          [({'job': job, 'span': name}, values['seconds']) for name, values in spans])
+    lines += _format_gauge('span_calls', 'Times each instrumented stage ran during the last run.',
+                           [({'job': job, 'span': name}, values['calls']) for name, values in spans])
+    lines += _format_gauge('span_max_seconds', 'Longest single run of each instrumented stage during the last run.',
+                           [({'job': job, 'span': name}, values['max_seconds']) for name, values in spans])
+    for name, value in report['counters'].items():
+        lines += _format_gauge(name, COUNTER_HELP.get(name, f'{name} during the last run.'), [({'job': job}, value)])
+    lines += _format_gauge('last_run_timestamp_seconds', 'Time the last run finished.',
+                           [({'job': job}, int(time.time()))])
+    return '\n'.join(lines) + '\n'
+
+
+def _write_atomic(path, text):
+    temp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    temp_path.write_text(text, encoding='UTF-8')
+    os.replace(temp_path, path)
+
+
+def render_metrics(job):
+    metrics = get_metrics()
+    if not metrics.enabled:
+        return ''
+    report = metrics.snapshot(job)
+    spans_df = pd.DataFrame([(name, values['calls'], round(values['seconds'], 3), round(values['max_seconds'], 3)) for
+                             name, values in report['spans'].items()],
+                            columns=['阶段', '次数', '总耗时（秒）', '最长耗时（秒）'])
+    counters_df = pd.DataFrame(list(report['counters'].items()), columns=['计数项', '数值'])
+    return f'<p>运行指标：</p>\n{render_table(spans_df)}\n{render_table(counters_df)}'
+
+
+def export_metrics(job):
+    metrics = get_metrics()
+    if not metrics.enabled:
+        return
+    report = metrics.snapshot(job)
+    folder = Path('/', *os.getenv('METRICS_FOLDER').split(',')).resolve()
+    try:
+        folder.mkdir(parents=True, exist_ok=True)
+        _write_atomic(Path(folder, f'{job}.json'), json.dumps(report, ensure_ascii=False, indent=2))
+        _write_atomic(Path(folder, f'{job}.prom'), to_prometheus(report))
+        Logger().info(msg=f'Exported {job} metrics to {folder}')
+    except OSError as e:
+        Logger().warning(msg=f'Failed to export {job} metrics: {e}')
+    metrics.reset()
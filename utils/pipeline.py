@@ -0,0 +1,94 @@
+import time
+
+from utils.logger import Logger
+from utils.metrics import observe
+
+
+class Stage(object):
+    def __init__(self, name, func, inputs=(), outputs=(), is_filter=False, row_wise=True):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.is_filter = is_filter
+        self.row_wise = row_wise
+
+
+def transform(name, func, inputs=(), outputs=(), row_wise=True):
+    return Stage(name, func, inputs, outputs, row_wise=row_wise)
+
+
+def row_filter(name, func, inputs=()):
+    return Stage(name, func, inputs, is_filter=True)
+
+
+class Pipeline(object):
+    def __init__(self, name, stages):
+        self.name = name
+        self.stages = list(stages)
+        self.timings = {}
+
+    def _prune(self, required):
+        if required is None:
+            return list(self.stages), None
+        needed = set(required)
+        stages = []
+        for stage in reversed(self.stages):
+            if stage.is_filter:
+                needed |= set(stage.inputs)
+            elif needed & set(stage.outputs):
+                needed = (needed - set(stage.outputs)) | set(stage.inputs)
+            else:
+                continue
+            stages.insert(0, stage)
+        return stages, needed
+
+    def _push_down_filters(self, stages):
+        stages = list(stages)
+        for index in range(len(stages)):
+            position = index
+            while position > 0 and stages[position].is_filter:
+                previous = stages[position - 1]
+                if previous.is_filter or not previous.row_wise or \
+                        set(previous.outputs) & set(stages[position].inputs):
+                    break
+                stages[position - 1], stages[position] = stages[position], previous
+                position -= 1
+        return stages
+
+    def plan(self, required=None):
+        stages, needed = self._prune(required)
+        steps = []
+        for stage in self._push_down_filters(stages):
+            if stage.is_filter and steps and steps[-1][0].is_filter:
+                steps[-1].append(stage)
+            else:
+                steps.append([stage])
+        return steps, needed
+
+    def _record(self, name, seconds):
+        total, calls = self.timings.get(name, (0.0, 0))
+        self.timings[name] = (total + seconds, calls + 1)
+        observe(f'pipeline.{self.name}.{name}', seconds)
+
+    def run(self, dataframe, required=None):
+        steps, needed = self.plan(required)
+        if needed is not None:
+            dataframe = dataframe.loc[:, [column for column in dataframe.columns if column in needed]]
+        for step in steps:
+            start = time.perf_counter()
+            if step[0].is_filter:
+                mask = step[0].func(dataframe)
+                for stage in step[1:]:
+                    mask &= stage.func(dataframe)
+                dataframe = dataframe[mask].copy()
+            else:
+                dataframe = step[0].func(dataframe)
+            self._record('+'.join(stage.name for stage in step), time.perf_counter() - start)
+        if required is not None:
+            dataframe = dataframe.loc[:, list(required)]
+        return dataframe
+
+    def log_timings(self):
+        for name, (seconds, calls) in self.timings.items():
+            Logger().info(msg=f'{self.name} pipeline stage {name}: {seconds:.3f}s over {calls} run(s)')
@@ -0,0 +1,74 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+import pyarrow as pa
+
+from utils.logger import Logger
+from utils.report_handoff import read_handoff, write_handoff
+
+CACHE_VERSION = 2
+
+
+def is_cache_enabled():
+    return os.getenv('REPORT_CACHE_ENABLED', 'true').lower() == 'true'
+
+
+class ReportCache(object):
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+                cls._instance.folder = Path('/', *os.getenv('REPORT_CACHE_FOLDER').split(',')).resolve()
+                cls._instance.max_bytes = int(os.getenv('REPORT_CACHE_MAX_BYTES', str(1024 ** 3)))
+                cls._instance.lock = threading.Lock()
+        return cls._instance
+
+    def _get_path(self, source, stage, load, args, kwargs, env):
+        stat = os.stat(source)
+        key = json.dumps([CACHE_VERSION, f'{load.__module__}.{load.__qualname__}', str(Path(source).resolve()),
+                          stat.st_size, stat.st_mtime_ns, args, sorted(kwargs.items()),
+                          {name: os.getenv(name) for name in env}], default=str)
+        return Path(self.folder, f'{stage}-{hashlib.sha256(key.encode()).hexdigest()[:32]}.arrow')
+
+    def _evict(self):
+        entries = []
+        for path in self.folder.glob('*.arrow'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def get(self, source, stage, load, *args, use_cache=True, env=(), **kwargs):
+        if not (use_cache and is_cache_enabled()):
+            return load(source, *args, **kwargs)
+        path = self._get_path(source, stage, load, args, kwargs, env)
+        if path.exists():
+            try:
+                dataframe, _ = read_handoff(path)
+                os.utime(path)
+                Logger().info(msg=f'Loaded {stage} report {source} from cache')
+                return dataframe
+            except (OSError, pa.ArrowInvalid) as e:
+                Logger().warning(msg=f'Failed to read cached {stage} report {path}: {e}')
+        dataframe = load(source, *args, **kwargs)
+        try:
+            with self.lock:
+                self.folder.mkdir(parents=True, exist_ok=True)
+                write_handoff(dataframe, path, source, preserve_index=None)
+                self._evict()
+        except OSError as e:
+            Logger().warning(msg=f'Failed to cache {stage} report {source}: {e}')
+        return dataframe
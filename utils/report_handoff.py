@@ -0,0 +1,201 @@
+import datetime
+import json
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+
+from utils.metrics import timed
+
+METADATA_KEY = b'report_handoff'
+MIXED_ENCODING = 'tagged'
+MIXED_TYPES = {
+    'str': str,
+    'int': int,
+    'float': float,
+    'bool': lambda text: text == 'True',
+    'datetime': datetime.datetime.fromisoformat,
+    'date': datetime.date.fromisoformat,
+    'time': datetime.time.fromisoformat,
+    'Timestamp': pd.Timestamp
+}
+
+
+def _is_arrow_compatible(series):
+    try:
+        pa.array(series, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return False
+    return True
+
+
+def _encode_value(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    tag = type(value).__name__
+    if tag not in MIXED_TYPES:
+        tag, value = 'str', str(value)
+    text = value.isoformat() if hasattr(value, 'isoformat') else str(value)
+    return f'{tag}:{text}'
+
+
+def _decode_value(text):
+    tag, _, text = text.partition(':')
+    return MIXED_TYPES[tag](text)
+
+
+def _get_mixed_columns(dataframe):
+    return [column for column in dataframe.columns[dataframe.dtypes == object] if
+            not _is_arrow_compatible(dataframe[column])]
+
+
+def _encode_series(series):
+    return [None if pd.isna(value) else _encode_value(value) for value in series]
+
+
+def _encode_mixed_columns(dataframe, columns):
+    if not columns:
+        return dataframe
+    return dataframe.assign(**{column: _encode_series(dataframe[column]) for column in columns})
+
+
+def _decode_mixed_columns(dataframe, columns):
+    for column in columns:
+        dataframe[column] = [np.nan if pd.isna(value) else _decode_value(value) for value in dataframe[column]]
+    return dataframe
+
+
+def _build_metadata(source, mixed_columns):
+    metadata = {
+        'source': str(source),
+        'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'mixed_columns': {str(column): MIXED_ENCODING for column in mixed_columns}
+    }
+    return {METADATA_KEY: json.dumps(metadata).encode()}
+
+
+def _get_temp_path(path):
+    return Path(path).with_name(f'.{Path(path).name}.tmp')
+
+
+def _get_storage_type(data_type):
+    if pa.types.is_dictionary(data_type):
+        return data_type.value_type
+    if pa.types.is_null(data_type):
+        return pa.string()
+    return data_type
+
+
+def write_handoff(dataframe, path, source, preserve_index=False):
+    mixed_columns = _get_mixed_columns(dataframe)
+    dataframe = _encode_mixed_columns(dataframe, mixed_columns)
+    table = pa.Table.from_pandas(dataframe, preserve_index=preserve_index)
+    table = table.replace_schema_metadata({**table.schema.metadata, **_build_metadata(source, mixed_columns)})
+    temp_path = _get_temp_path(path)
+    feather.write_feather(table, temp_path)
+    os.replace(temp_path, path)
+
+
+class HandoffWriter(object):
+    def __init__(self, path, source):
+        self.path = path
+        self.temp_path = _get_temp_path(path)
+        self.source = source
+        self.schema = None
+        self.writer = None
+        self.mixed_columns = []
+        self.generation = 0
+
+    def _open(self, schema):
+        self.schema = schema.with_metadata(_build_metadata(self.source, self.mixed_columns))
+        self.writer = pa.ipc.new_file(str(self.temp_path), self.schema)
+
+    def _cast(self, table):
+        arrays = []
+        failed_columns = []
+        for field, column in zip(self.schema, table.select(self.schema.names).columns):
+            try:
+                arrays.append(column.cast(field.type))
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                failed_columns.append(field.name)
+        return arrays, failed_columns
+
+    def _widen(self, columns):
+        self.writer.close()
+        previous_path = self.temp_path
+        self.generation += 1
+        self.temp_path = previous_path.with_name(f'.{Path(self.path).name}.{self.generation}.tmp')
+        self.mixed_columns += columns
+        self._open(pa.schema([pa.field(field.name, pa.string()) if field.name in columns else field for field in
+                              self.schema]))
+        with pa.memory_map(str(previous_path)) as source:
+            reader = pa.ipc.open_file(source)
+            for index in range(reader.num_record_batches):
+                batch = reader.get_batch(index)
+                arrays = [pa.array(_encode_series(column.to_pandas()), pa.string()) if name in columns else column for
+                          name, column in zip(batch.schema.names, batch.columns)]
+                self.writer.write_batch(pa.record_batch(arrays, schema=self.schema))
+        previous_path.unlink()
+
+    def _to_table(self, dataframe):
+        mixed_columns = [column for column in dataframe.columns if str(column) in self.mixed_columns]
+        return pa.Table.from_pandas(_encode_mixed_columns(dataframe, mixed_columns), preserve_index=False)
+
+    def write(self, dataframe):
+        mixed_columns = [str(column) for column in _get_mixed_columns(dataframe)]
+        if self.writer is None:
+            self.mixed_columns = mixed_columns
+        elif set(mixed_columns) - set(self.mixed_columns):
+            self._widen([column for column in mixed_columns if column not in self.mixed_columns])
+        table = self._to_table(dataframe)
+        if self.writer is None:
+            self._open(pa.schema([(field.name, _get_storage_type(field.type)) for field in table.schema]))
+        arrays, failed_columns = self._cast(table)
+        if failed_columns:
+            self._widen(failed_columns)
+            arrays, _ = self._cast(self._to_table(dataframe))
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        if self.writer is None:
+            self._open(pa.schema([]))
+        self.writer.close()
+        os.replace(self.temp_path, self.path)
+
+    def abort(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.temp_path.unlink(missing_ok=True)
+
+
+@contextmanager
+def open_handoff_writer(path, source):
+    handoff_writer = HandoffWriter(path, source)
+    try:
+        yield handoff_writer
+    except BaseException:
+        handoff_writer.abort()
+        raise
+    handoff_writer.close()
+
+
+@timed('ingest.handoff')
+def read_handoff(path):
+    table = feather.read_table(path, memory_map=True)
+    metadata = json.loads(table.schema.metadata.get(METADATA_KEY, b'{}'))
+    dataframe = table.to_pandas()
+    for column in dataframe.columns[dataframe.dtypes == object]:
+        dataframe[column] = dataframe[column].fillna(np.nan)
+    return _decode_mixed_columns(dataframe, metadata.get('mixed_columns', {})), metadata
+
+
+def get_handoff_path(output_folder_path, name):
+    return Path(output_folder_path, os.getenv(f'{name.upper()}_REPORT_HANDOFF'))
+
+
+def is_excel_output_enabled(name):
+    return os.getenv(f'{name.upper()}_REPORT_EXCEL_OUTPUT', 'true').lower() == 'true'
@@ -0,0 +1,42 @@
+import os
+
+import pandas as pd
+
+
+def get_category_columns(name):
+    columns = os.getenv(f'{name.upper()}_CATEGORY_COLUMNS')
+    return columns.split(',') if columns else []
+
+
+def is_categorical(series):
+    return isinstance(series.dtype, pd.CategoricalDtype)
+
+
+def to_categorical(dataframe, columns):
+    for column in columns:
+        if column in dataframe.columns and not is_categorical(dataframe[column]) and \
+                pd.api.types.infer_dtype(dataframe[column], skipna=True) in ('string', 'empty'):
+            dataframe[column] = dataframe[column].astype('category')
+    return dataframe
+
+
+def to_dense(series):
+    if not is_categorical(series):
+        return series
+    return series.astype(series.cat.categories.dtype if not series.hasnans else object)
+
+
+def fillna_series(series, value):
+    if is_categorical(series):
+        if value not in series.cat.categories:
+            series = series.cat.set_categories(sorted([*series.cat.categories, value]))
+        return series.fillna(value)
+    return series.fillna(value)
+
+
+def fill_missing(dataframe, value=''):
+    dataframe = dataframe.replace({None: value, pd.NA: value, float('nan'): value})
+    for column in dataframe.columns:
+        if is_categorical(dataframe[column]):
+            dataframe[column] = fillna_series(dataframe[column], value)
+    return dataframe
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+
+from utils.metrics import timed
+from utils.schema import fill_missing
+
+
+class ValidationRule(object):
+    def __init__(self, reason, check):
+        self.reason = reason
+        self.check = check
+
+
+def _is_missing(series):
+    return series.isna() | (series == '')
+
+
+def has_missing(column):
+    def check(dataframe, key_column):
+        return _is_missing(dataframe[column]).groupby(dataframe[key_column], observed=True).any()
+
+    return check
+
+
+def is_not_unique(column, unless_missing=False):
+    def check(dataframe, key_column):
+        not_unique = dataframe.groupby(key_column, observed=True)[column].nunique() != 1
+        if unless_missing:
+            not_unique &= ~has_missing(column)(dataframe, key_column)
+        return not_unique
+
+    return check
+
+
+def is_not_unique_date(column):
+    def check(dataframe, key_column):
+        return dataframe[column].dt.normalize().groupby(dataframe[key_column], observed=True).nunique() != 1
+
+    return check
+
+
+def has_duplicates(column):
+    def check(dataframe, key_column):
+        return dataframe.duplicated(subset=[key_column, column]).groupby(dataframe[key_column], observed=True).any()
+
+    return check
+
+
+def is_flagged(get_flagged_keys):
+    def check(dataframe, key_column):
+        keys = pd.Index(dataframe[key_column].dropna().unique())
+        return pd.Series(keys.isin(list(get_flagged_keys(keys))), index=keys)
+
+    return check
+
+
+@timed('validate')
+def validate_groups(dataframe, key_column, rules, reason_column='原因'):
+    keys = pd.Index(dataframe[key_column].dropna().unique()).sort_values()
+    flags = pd.DataFrame({rule.reason: rule.check(dataframe, key_column).reindex(keys, fill_value=False)
+                          for rule in rules}, index=keys).astype(bool)
+    flags = flags[flags.any(axis=1)]
+    reasons = np.full(len(flags), '', dtype=object)
+    for reason in flags.columns:
+        reasons = reasons + np.where(flags[reason].to_numpy(), reason + ', ', '')
+    result = pd.DataFrame({reason_column: [reason[:-2] for reason in reasons]}, index=flags.index)
+    result.index.name = key_column
+    return result
+
+
+def build_issue_report(dataframe, validate_result, key_column, columns_to_remove=None, reason_column='原因'):
+    keys = dataframe[key_column].str.lower()
+    reasons = pd.Series(validate_result[reason_column].to_numpy(), index=validate_result.index.str.lower())
+    result_df = dataframe.assign(**{key_column: keys, reason_column: keys.map(reasons)})
+    result_df = result_df[result_df[reason_column].notna()].reset_index(drop=True)
+    result_df = fill_missing(result_df)
+    if columns_to_remove:
+        result_df = result_df.drop(columns=columns_to_remove)
+    return result_df